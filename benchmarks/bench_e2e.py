@@ -0,0 +1,365 @@
+"""End-to-end load test: real services, local database, fake third parties.
+
+Starts attendance, catering and access-control under uvicorn, each against its own
+SQLite file (or one ephemeral Postgres cluster with --db postgres). Telegram, Jira,
+the calendar, MQTT, the ai-engine and the GraphQL invalidation hook are served by
+benchmarks/stubs.py. It seeds a workforce and then replays these workloads:
+
+- punch_storm: every employee clocks in at shift change
+- lunch_rush: every employee reserves lunch, each reservation rendering a QR code
+- fire_alarm_headcount: the alarm fires, then wardens poll the headcount
+- report_generation: HR pulls PDF and Excel attendance reports
+
+For each workload it records throughput, p50/p99 latency, errors and service RSS to
+a results file. Exits 1 when a workload regresses past --tolerance against the
+stored baseline, and 2 without comparing when the baseline was recorded with another
+database, workforce size or CPU count (keep one --baseline file per setup).
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --employees 5000 --db postgres --baseline benchmarks/results/e2e-pg-5000.json
+    python benchmarks/bench_e2e.py --update-baseline
+"""
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import MetaData, create_engine, insert, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import stubs
+
+SERVICES = ["attendance", "catering", "access-control"]
+BASELINE = os.path.join(ROOT, "benchmarks", "e2e_baseline.json")
+# Results are only comparable when these match
+COMPARABLE_META = ("db", "employees", "access_logs", "history_days", "cpus")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# Databases
+class SQLiteDatabases:
+    def __init__(self, workdir: str):
+        self.urls = {service: "sqlite:///" + os.path.join(workdir, f"{service}.db") for service in SERVICES}
+
+    def stop(self):
+        pass
+
+class EphemeralPostgres:
+    """A throwaway cluster from the local initdb/pg_ctl binaries, shared by all services like docker-compose."""
+
+    def __init__(self, workdir: str):
+        bindir = self.find_bindir()
+        self.pg_ctl = os.path.join(bindir, "pg_ctl")
+        self.datadir = os.path.join(workdir, "pgdata")
+        port = free_port()
+        subprocess.run([os.path.join(bindir, "initdb"), "-D", self.datadir, "-U", "bench", "--auth=trust"], check=True, capture_output=True)
+        subprocess.run([
+            self.pg_ctl, "-D", self.datadir, "-l", os.path.join(workdir, "postgres.log"), "-w", "start",
+            "-o", f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1 -c fsync=off -c max_connections=200",
+        ], check=True, capture_output=True)
+        admin = create_engine(f"postgresql://bench@127.0.0.1:{port}/postgres", isolation_level="AUTOCOMMIT")
+        with admin.connect() as conn:
+            conn.execute(text("CREATE DATABASE attendance_db"))
+        admin.dispose()
+        url = f"postgresql://bench@127.0.0.1:{port}/attendance_db"
+        self.urls = {service: url for service in SERVICES}
+
+    @staticmethod
+    def find_bindir() -> str:
+        initdb = shutil.which("initdb")
+        if initdb:
+            return os.path.dirname(initdb)
+        candidates = sorted(glob.glob("/usr/lib/postgresql/*/bin/initdb"))
+        if not candidates:
+            raise SystemExit("--db postgres needs initdb and pg_ctl on PATH")
+        return os.path.dirname(candidates[-1])
+
+    def stop(self):
+        subprocess.run([self.pg_ctl, "-D", self.datadir, "-m", "immediate", "stop"], capture_output=True)
+
+# Services
+def start_stubs():
+    http_port, mqtt_port = free_port(), free_port()
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=stubs.serve, args=(http_port, mqtt_port, ready), daemon=True)
+    process.start()
+    ready.wait(10)
+    return process, http_port, mqtt_port
+
+def start_services(urls: dict, stub_port: int, mqtt_port: int, workdir: str) -> dict:
+    stub = f"http://127.0.0.1:{stub_port}"
+    processes = {}
+    for service in SERVICES:
+        port = free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=urls[service],
+            REDIS_URL="redis://127.0.0.1:1",
+            GRAPHQL_URL=stub,
+            TELEGRAM_API_URL=f"{stub}/bot",
+            JIRA_API_URL=f"{stub}/api",
+            CALENDAR_API_URL=f"{stub}/api",
+            AI_ENGINE_URL=stub,
+            MQTT_BROKER="127.0.0.1",
+            MQTT_PORT=str(mqtt_port),
+            PYTHONDONTWRITEBYTECODE="1",
+        )
+        log = open(os.path.join(workdir, f"{service}.log"), "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.join(ROOT, "services", service, "app"), env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        processes[service] = (process, f"http://127.0.0.1:{port}")
+    deadline = time.time() + 120
+    for service, (process, base_url) in processes.items():
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f"{service} exited during startup; see {workdir}/{service}.log")
+            try:
+                if httpx.get(f"{base_url}/metrics", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline:
+                raise SystemExit(f"{service} did not start; see {workdir}/{service}.log")
+            time.sleep(0.2)
+    return processes
+
+def rss_mb(pid: int) -> dict:
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    fields["rss_mb" if key == "VmRSS" else "peak_rss_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return fields
+
+# Seed data
+def employee_ids(employees: int) -> range:
+    # id 1 is the HR account created through the API before seeding
+    return range(2, employees + 2)
+
+def seed(urls: dict, employees: int, access_logs: int, history_days: int):
+    now = datetime.utcnow()
+    ids = employee_ids(employees)
+    engines = {}
+    def table(service, name):
+        if service not in engines:
+            engine = create_engine(urls[service])
+            metadata = MetaData()
+            metadata.reflect(bind=engine)
+            engines[service] = (engine, metadata)
+        return engines[service][0], engines[service][1].tables[name]
+
+    engine, users = table("attendance", "users")
+    _, shifts = table("attendance", "shifts")
+    _, attendances = table("attendance", "attendances")
+    with engine.begin() as conn:
+        conn.execute(insert(users), [{"id": i, "name": f"employee-{i}", "qr_code": f"qr-{i}", "role": "employee"} for i in ids])
+        conn.execute(insert(shifts), [{"user_id": i, "start_time": now - timedelta(minutes=30), "end_time": now + timedelta(hours=8), "is_remote": i % 5 == 0} for i in ids])
+        history = []
+        for day in range(1, history_days + 1):
+            start = now - timedelta(days=day)
+            for i in ids[::10]:
+                history.append({"user_id": i, "timestamp": start.replace(hour=8), "is_entry": True, "penalty": 0.0, "reward": 5.0})
+                history.append({"user_id": i, "timestamp": start.replace(hour=16), "is_entry": False, "penalty": 0.0, "reward": 0.0})
+        conn.execute(insert(attendances), history)
+
+    engine, menus = table("catering", "menus")
+    with engine.begin() as conn:
+        conn.execute(insert(menus), [{"id": i, "name": f"menu-{i}", "calories": 600.0, "allergens": "", "group": "staff"} for i in range(1, 11)])
+
+    engine, logs = table("access-control", "access_logs")
+    with engine.begin() as conn:
+        conn.execute(insert(logs), [{"user_id": ids[i % employees], "location": f"gate-{i % 8}", "timestamp": now - timedelta(seconds=i % 3600), "is_vehicle": i % 7 == 0} for i in range(access_logs)])
+    for engine, _ in engines.values():
+        engine.dispose()
+
+def login(base_url: str) -> str:
+    httpx.post(f"{base_url}/users/", json={"name": "bench-hr", "qr_code": "bench-hr", "password": "bench", "nfc_tag": None, "role": "hr"}, timeout=30).raise_for_status()
+    response = httpx.post(f"{base_url}/token", data={"username": "bench-hr", "password": "bench"}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+# Workloads
+async def replay(requests, concurrency: int, headers=None) -> dict:
+    """Sends (method, url, kwargs) requests with at most ``concurrency`` in flight."""
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120, headers=headers) as client:
+        async def one(method, url, kwargs):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*request) for request in requests))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(requests) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+def punch_storm(urls, employees, token):
+    requests = [("POST", f"{urls['attendance']}/attendance/", {"json": {"user_id": i, "is_entry": True}}) for i in employee_ids(employees)]
+    return requests, {"Authorization": f"Bearer {token}"}
+
+def lunch_rush(urls, employees, token):
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0).isoformat()
+    requests = [("POST", f"{urls['catering']}/reservations/", {"json": {"user_id": i, "menu_id": i % 10 + 1, "quantity": 1, "date": today, "is_guest": False}}) for i in employee_ids(employees)]
+    return requests, None
+
+def fire_alarm_headcount(urls, employees, token):
+    polls = max(20, employees // 20)
+    requests = [("POST", f"{urls['access-control']}/emergency/fire-alarm/", {})]
+    requests += [("GET", f"{urls['access-control']}/emergency/headcount/", {}) for _ in range(polls)]
+    return requests, None
+
+def report_generation(urls, employees, token):
+    requests = []
+    for _ in range(5):
+        requests.append(("GET", f"{urls['attendance']}/reports/attendance/pdf", {}))
+        requests.append(("GET", f"{urls['attendance']}/reports/attendance/excel", {}))
+    return requests, {"Authorization": f"Bearer {token}"}
+
+# Concurrency stays within each service's DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, 30 by default)
+WORKLOADS = {
+    "punch_storm": (punch_storm, 25),
+    "lunch_rush": (lunch_rush, 25),
+    "fire_alarm_headcount": (fire_alarm_headcount, 10),
+    "report_generation": (report_generation, 4),
+}
+
+# Baseline
+def mismatched_meta(results: dict, baseline: dict) -> list:
+    current, previous = results["meta"], baseline.get("meta", {})
+    return [f"{key}: baseline {previous.get(key)}, this run {current.get(key)}" for key in COMPARABLE_META if previous.get(key) != current.get(key)]
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in results["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous:
+            continue
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']} -> {current['p99_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workloads", nargs="*", default=list(WORKLOADS))
+    parser.add_argument("--db", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--access-logs", type=int, default=20000)
+    parser.add_argument("--history-days", type=int, default=20)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "e2e-latest.json"))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the work directory with service logs")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    databases = EphemeralPostgres(workdir) if args.db == "postgres" else SQLiteDatabases(workdir)
+    stub_process, stub_port, mqtt_port = start_stubs()
+    processes = {}
+    try:
+        processes = start_services(databases.urls, stub_port, mqtt_port, workdir)
+        urls = {service: base_url for service, (_, base_url) in processes.items()}
+        token = login(urls["attendance"])
+        seed(databases.urls, args.employees, args.access_logs, args.history_days)
+        results = {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+                "db": args.db,
+                "employees": args.employees,
+                "access_logs": args.access_logs,
+                "history_days": args.history_days,
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "workloads": {},
+        }
+        for name in args.workloads:
+            build, concurrency = WORKLOADS[name]
+            requests, headers = build(urls, args.employees, token)
+            result = asyncio.run(replay(requests, concurrency, headers))
+            result["concurrency"] = concurrency
+            result["memory"] = {service: rss_mb(process.pid) for service, (process, _) in processes.items()}
+            results["workloads"][name] = result
+            print(f"{name}: {result['throughput_rps']} rps, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, {result['errors']} errors", file=sys.stderr)
+        results["stubs"] = httpx.get(f"http://127.0.0.1:{stub_port}/_stats").json()
+    finally:
+        for process, _ in processes.values():
+            process.terminate()
+        for process, _ in processes.values():
+            process.wait(10)
+        stub_process.terminate()
+        databases.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        regressions = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatched = mismatched_meta(results, baseline)
+        if mismatched:
+            print(f"Not comparing against {args.baseline}, it was recorded with different parameters:", file=sys.stderr)
+            for line in mismatched:
+                print(f"  {line}", file=sys.stderr)
+            print("Rerun with matching options, or pass --baseline/--update-baseline for this setup.", file=sys.stderr)
+            sys.exit(2)
+        regressions = compare(results, baseline, args.tolerance)
+    else:
+        regressions = []
+    results["regressions"] = regressions
+    print(json.dumps({"workloads": results["workloads"], "regressions": regressions}, indent=2))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
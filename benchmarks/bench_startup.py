@@ -0,0 +1,105 @@
+"""Measure cold import time, lifespan startup and peak RSS of each service against a budget.
+
+    python benchmarks/bench_startup.py                     # check every service against startup_budgets.json
+    python benchmarks/bench_startup.py attendance --eager  # LAZY_STARTUP=0, for comparison
+    python benchmarks/bench_startup.py --root /tmp/old     # measure another checkout
+
+Each sample runs in a fresh interpreter with a throwaway SQLite database, so no
+Postgres, Redis or MQTT broker is needed. Exits non-zero when a budget is exceeded
+or a module listed under "lazy" was imported during startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = ["attendance", "catering", "access-control", "ai-engine", "graphql"]
+
+PROBE = """
+import asyncio, json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter() - started
+
+ready = asyncio.run(boot())
+print(json.dumps({
+    "import_seconds": imported,
+    "ready_seconds": ready,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+def sample(root: str, service: str, eager: bool) -> dict:
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL="sqlite:///" + os.path.join(workdir, "startup.db"),
+        LAZY_STARTUP="0" if eager else "1",
+        LIVE_FEED="false",
+        GRAPHQL_CACHE_BACKEND="memory",
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=os.path.join(root, "services", service, "app"),
+        env=env, capture_output=True, text=True, timeout=300,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{service} failed to start:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(root: str, service: str, eager: bool, repeat: int) -> dict:
+    # The first run warms the OS page cache; report the median of the rest
+    samples = [sample(root, service, eager) for _ in range(repeat + 1)][1:]
+    return {
+        "import_seconds": round(statistics.median(s["import_seconds"] for s in samples), 3),
+        "ready_seconds": round(statistics.median(s["ready_seconds"] for s in samples), 3),
+        "rss_mb": round(max(s["rss_mb"] for s in samples), 1),
+        "modules": samples[-1]["modules"],
+    }
+
+def check(service: str, result: dict, budget: dict) -> list:
+    failures = []
+    for key in ("import_seconds", "ready_seconds", "rss_mb"):
+        if key in budget and result[key] > budget[key]:
+            failures.append(f"{service}: {key} {result[key]} > budget {budget[key]}")
+    loaded = set(result["modules"])
+    for module in budget.get("lazy", []):
+        if module in loaded:
+            failures.append(f"{service}: {module} imported at startup")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("services", nargs="*", default=SERVICES)
+    parser.add_argument("--root", default=ROOT)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--eager", action="store_true")
+    parser.add_argument("--budgets", default=os.path.join(ROOT, "benchmarks", "startup_budgets.json"))
+    parser.add_argument("--no-check", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    report, failures = {}, []
+    for service in args.services:
+        result = measure(args.root, service, args.eager, args.repeat)
+        budget = budgets.get(service, {})
+        report[service] = {key: value for key, value in result.items() if key != "modules"}
+        report[service]["heavy_loaded"] = [m for m in budget.get("lazy", []) if m in result["modules"]]
+        if not args.no_check and not args.eager:
+            failures += check(service, result, budget)
+    print(json.dumps({"eager": args.eager, "services": report, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Local stand-ins for the third parties the services call, for load tests.
+
+One HTTP server answers as Telegram, Jira, the calendar, the ai-engine and the
+GraphQL cache-invalidation hook. A minimal MQTT 3.1.1 broker accepts connections and
+QoS 0/1 publishes. Both count what they receive (GET /_stats on the HTTP server).
+
+    python benchmarks/stubs.py --http-port 9100 --mqtt-port 9183
+"""
+import argparse
+import json
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stats = Counter()
+stats_lock = threading.Lock()
+
+def count(key: str):
+    with stats_lock:
+        stats[key] += 1
+
+def telegram_message(payload: dict) -> dict:
+    return {
+        "message_id": stats["telegram"],
+        "date": int(time.time()),
+        "chat": {"id": 1, "type": "private"},
+        "text": payload.get("text", ""),
+    }
+
+def respond(path: str, payload: dict):
+    if path.startswith("/bot"):
+        method = path.rsplit("/", 1)[-1]
+        count("telegram")
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}}
+        return {"ok": True, "result": telegram_message(payload)}
+    if path.startswith("/api/tasks"):
+        count("jira")
+        return {"id": stats["jira"]}
+    if path.startswith("/api/meetings/"):
+        count("calendar")
+        return {"status": "linked"}
+    if path == "/detect-fraud/":
+        count("ai-engine")
+        return {"fraud": False}
+    if path == "/predict-demand/":
+        count("ai-engine")
+        return {"forecast": []}
+    if path == "/optimize-shifts/":
+        count("ai-engine")
+        return {"shifts": [0] * len(payload) if isinstance(payload, list) else []}
+    if path == "/cache/invalidate":
+        count("graphql")
+        return {"status": "invalidated"}
+    count("other")
+    return {}
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with stats_lock:
+                return self.reply(dict(stats))
+        self.reply(respond(self.path.split("?", 1)[0], {}))
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Type", "").startswith("application/json") and raw:
+            payload = json.loads(raw)
+        else:
+            # python-telegram-bot posts form data; only the text matters here
+            payload = {}
+        self.reply(respond(self.path.split("?", 1)[0], payload))
+
+# MQTT
+def read_packet(rfile):
+    header = rfile.read(1)
+    if not header:
+        return None, b""
+    length, multiplier = 0, 1
+    while True:
+        byte = rfile.read(1)
+        if not byte:
+            return None, b""
+        length += (byte[0] & 0x7F) * multiplier
+        if not byte[0] & 0x80:
+            break
+        multiplier *= 128
+    return header[0], rfile.read(length)
+
+class MQTTHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            header, body = read_packet(self.rfile)
+            if header is None:
+                return
+            kind = header >> 4
+            if kind == 1:  # CONNECT
+                self.wfile.write(b"\x20\x02\x00\x00")
+            elif kind == 3:  # PUBLISH
+                count("mqtt")
+                qos = (header >> 1) & 0x03
+                if qos:
+                    topic_length = struct.unpack("!H", body[:2])[0]
+                    packet_id = body[2 + topic_length:4 + topic_length]
+                    self.wfile.write(b"\x40\x02" + packet_id)
+            elif kind == 8:  # SUBSCRIBE
+                packet_id, topics, offset = body[:2], 0, 2
+                while offset < len(body):
+                    offset += 2 + struct.unpack("!H", body[offset:offset + 2])[0] + 1
+                    topics += 1
+                self.wfile.write(bytes([0x90, 2 + topics]) + packet_id + b"\x00" * topics)
+            elif kind == 12:  # PINGREQ
+                self.wfile.write(b"\xd0\x00")
+            elif kind == 14:  # DISCONNECT
+                return
+
+class MQTTServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(http_port: int, mqtt_port: int, ready=None):
+    http_server = ThreadingHTTPServer(("127.0.0.1", http_port), StubHandler)
+    http_server.daemon_threads = True
+    mqtt_server = MQTTServer(("127.0.0.1", mqtt_port), MQTTHandler)
+    threading.Thread(target=mqtt_server.serve_forever, daemon=True).start()
+    if ready is not None:
+        ready.set()
+    http_server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--http-port", type=int, default=9100)
+    parser.add_argument("--mqtt-port", type=int, default=9183)
+    args = parser.parse_args()
+    serve(args.http_port, args.mqtt_port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""Cold archive: moves old rows out of a hot table into Parquet segments.
+
+Attendance and access-control keep identical copies of this module. Rows older than
+the horizon move in batches to ``<ARCHIVE_DIR>/<table>/month=YYYY-MM/*.parquet``.
+Files are compressed and sorted by user and time, with row-group statistics, so
+scans skip row groups that cannot match a user_id or date predicate.
+
+The ``archive_segments`` table is the manifest. A file becomes part of the archive
+when its manifest row commits, in the same transaction that deletes the hot rows.
+Every segment records its row count, the file's SHA-256 and a checksum of its rows.
+The writer checks them before deleting anything, and ``verify`` checks them again.
+"""
+import hashlib
+import json
+import operator
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import reduce
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, Integer, String, Table, delete, func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Base
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "/data/archive")
+HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50000"))
+ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "16384"))
+COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+COMPACT_SEGMENTS = int(os.getenv("ARCHIVE_COMPACT_SEGMENTS", "8"))
+ORPHAN_GRACE_SECONDS = int(os.getenv("ARCHIVE_ORPHAN_GRACE_SECONDS", "3600"))
+DELETE_CHUNK = 5000
+
+class ArchiveSegment(Base):
+    __tablename__ = "archive_segments"
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, index=True)
+    path = Column(String, unique=True)  # relative to the table's archive directory
+    month = Column(Date, index=True)
+    rows = Column(Integer)
+    bytes = Column(Integer)
+    first_id = Column(Integer)
+    last_id = Column(Integer)
+    min_timestamp = Column(DateTime)
+    max_timestamp = Column(DateTime)
+    min_user_id = Column(Integer, nullable=True)
+    max_user_id = Column(Integer, nullable=True)
+    file_sha256 = Column(String)
+    content_sha256 = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    verified_at = Column(DateTime, nullable=True)
+
+class ArchivedTable:
+    """A hot table whose rows older than ``horizon_days`` move to Parquet under ``root``."""
+
+    def __init__(self, table: Table, time_column: str = "timestamp", user_column: str = "user_id", horizon_days: Optional[int] = None, root: Optional[str] = None):
+        self.table = table
+        self.name = table.name
+        self.time_column = time_column
+        self.user_column = user_column
+        self.horizon_days = HORIZON_DAYS if horizon_days is None else horizon_days
+        self.root = os.path.join(root or ARCHIVE_DIR, table.name)
+
+    def path(self, relative: str) -> str:
+        return os.path.join(self.root, relative)
+
+# Files
+def arrow_type(column: Column):
+    import pyarrow as pa
+    kind = column.type
+    if isinstance(kind, Boolean):
+        return pa.bool_()
+    if isinstance(kind, Integer):
+        return pa.int64()
+    if isinstance(kind, Float):
+        return pa.float64()
+    if isinstance(kind, DateTime):
+        return pa.timestamp("us")
+    if isinstance(kind, Date):
+        return pa.date32()
+    return pa.string()
+
+def arrow_schema(target: ArchivedTable) -> "pa.Schema":
+    import pyarrow as pa
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in target.table.columns])
+
+def to_arrow(target: ArchivedTable, rows) -> "pa.Table":
+    import pyarrow as pa
+    schema = arrow_schema(target)
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.Table.from_arrays([pa.array(list(values), type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+def content_checksum(data: "pa.Table") -> str:
+    """SHA-256 over the rows in id order, independent of file layout and compression."""
+    data = data.sort_by("id")
+    digest = hashlib.sha256(",".join(data.column_names).encode())
+    for row in zip(*(column.to_pylist() for column in data.columns)):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_segment(path: str, columns: Optional[List[str]] = None) -> "pa.Table":
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def write_segment(target: ArchivedTable, data: "pa.Table") -> ArchiveSegment:
+    """Writes one month of rows and reads them back before returning the (unsaved) manifest row."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    data = data.sort_by([(target.user_column, "ascending"), (target.time_column, "ascending")])
+    times = data.column(target.time_column)
+    users = data.column(target.user_column)
+    ids = data.column("id")
+    first_id, last_id = pc.min(ids).as_py(), pc.max(ids).as_py()
+    min_timestamp = pc.min(times).as_py()
+    month = min_timestamp.date().replace(day=1)
+    relative = os.path.join(f"month={month:%Y-%m}", f"{first_id:012d}-{last_id:012d}-{uuid.uuid4().hex[:8]}.parquet")
+    path = target.path(relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".partial"
+    pq.write_table(data, partial, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    with open(partial, "rb") as f:
+        os.fsync(f.fileno())
+    checksum = content_checksum(data)
+    stored = read_segment(partial)
+    if stored.num_rows != data.num_rows or content_checksum(stored) != checksum:
+        _remove(partial)
+        raise RuntimeError(f"{target.name}: archived segment does not read back as written")
+    os.replace(partial, path)
+    return ArchiveSegment(
+        table_name=target.name,
+        path=relative,
+        month=month,
+        rows=data.num_rows,
+        bytes=os.path.getsize(path),
+        first_id=first_id,
+        last_id=last_id,
+        min_timestamp=min_timestamp,
+        max_timestamp=pc.max(times).as_py(),
+        min_user_id=pc.min(users).as_py(),
+        max_user_id=pc.max(users).as_py(),
+        file_sha256=file_checksum(path),
+        content_sha256=checksum,
+    )
+
+def split_by_month(target: ArchivedTable, data: "pa.Table") -> Iterator["pa.Table"]:
+    import pyarrow.compute as pc
+    times = data.column(target.time_column)
+    months = pc.add(pc.multiply(pc.year(times), 100), pc.month(times))
+    for month in pc.unique(months).to_pylist():
+        yield data.filter(pc.equal(months, month))
+
+# Archival
+def archive_batch(db: Session, target: ArchivedTable, cutoff: datetime, batch_size: Optional[int] = None) -> int:
+    """Moves up to ``batch_size`` rows older than ``cutoff`` to Parquet and commits.
+
+    Files are durable and verified before the hot rows are deleted. If another run
+    already moved some of the rows, the batch rolls back and its files are removed.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    table = target.table
+    rows = db.execute(select(*table.columns).where(table.c[target.time_column] < cutoff).order_by(table.c.id).limit(batch_size)).all()
+    if not rows:
+        return 0
+    written = []
+    try:
+        for month in split_by_month(target, to_arrow(target, rows)):
+            segment = write_segment(target, month)
+            written.append(segment.path)
+            db.add(segment)
+        ids = [row.id for row in rows]
+        deleted = sum(db.execute(delete(table).where(table.c.id.in_(ids[i:i + DELETE_CHUNK]))).rowcount for i in range(0, len(ids), DELETE_CHUNK))
+        if deleted != len(ids):
+            raise RuntimeError(f"{target.name}: {len(ids) - deleted} rows were archived concurrently")
+        db.commit()
+    except BaseException:
+        db.rollback()
+        for relative in written:
+            _remove(target.path(relative))
+        raise
+    return len(rows)
+
+def compact(db: Session, target: ArchivedTable, min_segments: Optional[int] = None) -> int:
+    """Merges each month holding at least ``min_segments`` segments into one file.
+
+    Replaced files are left for ``remove_orphans``, so scans that listed them just
+    before the swap can still read them.
+    """
+    import pyarrow as pa
+    min_segments = min_segments or COMPACT_SEGMENTS
+    months = [month for month, in db.query(ArchiveSegment.month).filter(ArchiveSegment.table_name == target.name).group_by(ArchiveSegment.month).having(func.count() >= min_segments)]
+    merged = 0
+    for month in months:
+        segments = db.query(ArchiveSegment).filter(ArchiveSegment.table_name == target.name, ArchiveSegment.month == month).all()
+        data = pa.concat_tables([read_segment(target.path(segment.path)) for segment in segments])
+        if data.num_rows != sum(segment.rows for segment in segments):
+            raise RuntimeError(f"{target.name}: segments for {month} do not match the manifest")
+        replacement = write_segment(target, data)
+        for segment in segments:
+            db.delete(segment)
+        db.add(replacement)
+        db.commit()
+        merged += len(segments)
+    return merged
+
+def remove_orphans(db: Session, target: ArchivedTable, grace_seconds: Optional[int] = None) -> int:
+    """Deletes files missing from the manifest once they are older than the grace period.
+
+    These are leftovers of interrupted runs and files replaced by compaction. The grace
+    period spares files that a concurrent run has written but not yet committed.
+    """
+    grace_seconds = ORPHAN_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    known = {path for path, in db.query(ArchiveSegment.path).filter(ArchiveSegment.table_name == target.name)}
+    threshold = time.time() - grace_seconds
+    removed = 0
+    for directory, _, files in os.walk(target.root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if os.path.relpath(path, target.root) not in known and os.path.getmtime(path) < threshold:
+                _remove(path)
+                removed += 1
+    return removed
+
+def run_archival(db: Session, target: ArchivedTable, now: Optional[datetime] = None, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> dict:
+    """Archives everything past the horizon in committed batches; safe to interrupt and rerun."""
+    started = time.perf_counter()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=target.horizon_days)
+    orphans = remove_orphans(db, target)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(db, target, cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return {
+        "table": target.name,
+        "cutoff": cutoff.isoformat(),
+        "rows_archived": moved,
+        "batches": batches,
+        "segments_compacted": compact(db, target),
+        "orphans_removed": orphans,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def verify(db: Session, target: ArchivedTable, deep: bool = False) -> dict:
+    """Checks every segment against the manifest.
+
+    Each file must exist, match its SHA-256 and hold the recorded number of rows.
+    ``deep`` also re-reads every row to compare the content checksum, and checks that
+    no archived id is still in the hot table.
+    """
+    import pyarrow.parquet as pq
+    started = time.perf_counter()
+    table = target.table
+    segments = db.query(ArchiveSegment).filter(ArchiveSegment.table_name == target.name).order_by(ArchiveSegment.id).all()
+    problems = []
+    for segment in segments:
+        path = target.path(segment.path)
+        if not os.path.exists(path):
+            problems.append({"segment": segment.path, "problem": "missing"})
+            continue
+        if file_checksum(path) != segment.file_sha256:
+            problems.append({"segment": segment.path, "problem": "file checksum mismatch"})
+            continue
+        if pq.ParquetFile(path).metadata.num_rows != segment.rows:
+            problems.append({"segment": segment.path, "problem": "row count mismatch"})
+            continue
+        if deep:
+            data = read_segment(path)
+            if content_checksum(data) != segment.content_sha256:
+                problems.append({"segment": segment.path, "problem": "content checksum mismatch"})
+                continue
+            ids = data.column("id").to_pylist()
+            still_hot = sum(db.execute(select(func.count()).select_from(table).where(table.c.id.in_(ids[i:i + DELETE_CHUNK]))).scalar() for i in range(0, len(ids), DELETE_CHUNK))
+            if still_hot:
+                problems.append({"segment": segment.path, "problem": f"{still_hot} rows also in the hot table"})
+    if not problems:
+        now = datetime.utcnow()
+        for segment in segments:
+            segment.verified_at = now
+        db.commit()
+    return {
+        "table": target.name,
+        "ok": not problems,
+        "segments": len(segments),
+        "archived_rows": sum(segment.rows for segment in segments),
+        "hot_rows": db.execute(select(func.count()).select_from(table)).scalar(),
+        "bytes": sum(segment.bytes for segment in segments),
+        "problems": problems,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+# Queries
+def naive_utc(t: Optional[datetime]) -> Optional[datetime]:
+    """Archived timestamps are naive UTC, like the hot columns; aware bounds (``...Z``) are converted."""
+    return t.astimezone(timezone.utc).replace(tzinfo=None) if t is not None and t.tzinfo is not None else t
+
+def segments_for(db: Session, target: ArchivedTable, start: Optional[datetime] = None, end: Optional[datetime] = None, user_ids: Optional[List[int]] = None) -> List[ArchiveSegment]:
+    """Segments whose time and user ranges can overlap the predicate, from the manifest alone."""
+    start, end = naive_utc(start), naive_utc(end)
+    q = db.query(ArchiveSegment).filter(ArchiveSegment.table_name == target.name)
+    if start is not None:
+        q = q.filter(ArchiveSegment.max_timestamp >= start)
+    if end is not None:
+        q = q.filter(ArchiveSegment.min_timestamp < end)
+    if user_ids:
+        q = q.filter(ArchiveSegment.min_user_id <= max(user_ids), ArchiveSegment.max_user_id >= min(user_ids))
+    return q.order_by(ArchiveSegment.first_id).all()
+
+def read_cold(target: ArchivedTable, segments: List[ArchiveSegment], start: Optional[datetime] = None, end: Optional[datetime] = None, user_ids: Optional[List[int]] = None, columns: Optional[List[str]] = None) -> "pa.Table":
+    """Memory-mapped scan of ``segments``; the predicate prunes row groups by their statistics."""
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+    schema = arrow_schema(target)
+    if not segments:
+        return schema.empty_table().select(columns or schema.names)
+    start, end = naive_utc(start), naive_utc(end)
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field(target.time_column) >= start)
+    if end is not None:
+        conditions.append(ds.field(target.time_column) < end)
+    if user_ids:
+        user = ds.field(target.user_column)
+        # The range lets row groups be skipped by min/max even when is_in cannot
+        conditions += [user >= min(user_ids), user <= max(user_ids), user.isin(list(user_ids))]
+    dataset = ds.dataset([target.path(segment.path) for segment in segments], schema=schema, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=columns, filter=reduce(operator.and_, conditions) if conditions else None)
+
+def scan(db: Session, target: ArchivedTable, start: Optional[datetime] = None, end: Optional[datetime] = None, user_ids: Optional[List[int]] = None, columns: Optional[List[str]] = None) -> "pd.DataFrame":
+    """Hot and archived rows in ``[start, end)`` as one frame in id order, with an ``archived`` flag.
+
+    The hot table is read before the manifest. A batch archived in between then shows
+    up in both reads and is deduplicated by id instead of being missed.
+    """
+    import pandas as pd
+    start, end = naive_utc(start), naive_utc(end)
+    table = target.table
+    names = columns or [column.name for column in table.columns]
+    read = list(dict.fromkeys(["id", *names]))
+    query = select(*(table.c[name] for name in read))
+    if start is not None:
+        query = query.where(table.c[target.time_column] >= start)
+    if end is not None:
+        query = query.where(table.c[target.time_column] < end)
+    if user_ids:
+        query = query.where(table.c[target.user_column].in_(list(user_ids)))
+    hot = pd.DataFrame(db.execute(query).all(), columns=read)
+    if target.time_column in read:
+        hot[target.time_column] = pd.to_datetime(hot[target.time_column]).astype("datetime64[ns]")
+    cold = read_cold(target, segments_for(db, target, start, end, user_ids), start, end, user_ids, read).to_pandas(coerce_temporal_nanoseconds=True)
+    cold = cold[~cold["id"].isin(hot["id"])]
+    hot["archived"] = False
+    cold["archived"] = True
+    frames = [frame for frame in (cold, hot) if len(frame)]
+    if not frames:
+        return hot[names + ["archived"]]
+    return pd.concat(frames, ignore_index=True).sort_values("id", kind="mergesort")[names + ["archived"]].reset_index(drop=True)
+
+def group_key(frame: "pd.DataFrame", target: ArchivedTable, by: str) -> "pd.Series":
+    """Grouping column for analytics: user, day, month or any column name."""
+    if by == "user":
+        return frame[target.user_column].rename("user_id")
+    if by == "day":
+        return frame[target.time_column].dt.date.rename("day")
+    if by == "month":
+        return frame[target.time_column].dt.to_period("M").dt.start_time.dt.date.rename("month")
+    return frame[by]
+
+def records(frame: "pd.DataFrame") -> List[dict]:
+    """JSON-ready rows (Python scalars, None for missing values)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+# GDPR
+def erase_user(db: Session, target: ArchivedTable, user_id: int, mode: str = "delete") -> int:
+    """Rewrites each segment holding the subject's rows without them, or with user_id cleared.
+
+    Commits per segment and removes the old file right away, since it holds erased data.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    affected = 0
+    for segment in segments_for(db, target, user_ids=[user_id]):
+        path = target.path(segment.path)
+        data = read_segment(path)
+        users = data.column(target.user_column)
+        mask = pc.fill_null(pc.equal(users, user_id), False)
+        matches = pc.sum(mask).as_py() or 0
+        if not matches:
+            continue
+        if mode == "anonymize":
+            data = data.set_column(data.schema.get_field_index(target.user_column), target.user_column, pc.if_else(mask, pa.scalar(None, pa.int64()), users))
+        else:
+            data = data.filter(pc.invert(mask))
+        if data.num_rows:
+            db.add(write_segment(target, data))
+        db.delete(segment)
+        db.commit()
+        _remove(path)
+        affected += matches
+    return affected
+
+def export_rows(target: ArchivedTable, user_id: int) -> Iterator[bytes]:
+    """NDJSON lines for the subject's archived rows, one segment in memory at a time."""
+    db = SessionLocal()
+    try:
+        segments = segments_for(db, target, user_ids=[user_id])
+    finally:
+        db.close()
+    for segment in segments:
+        for row in read_cold(target, [segment], user_ids=[user_id]).to_pylist():
+            yield (json.dumps({"table": f"{target.name}_archive", "row": row}, default=str) + "\n").encode()
@@ -1,27 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
-import cv2
+from typing import List, Optional
 import numpy as np
 from database import SessionLocal, engine, Base
-from paho.mqtt import client as mqtt_client
+import archive
+from archive import ArchivedTable
+import gdpr
+from gdpr import Target
+import instrumentation
+from instrumentation import external_call
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
+from redis import asyncio as aioredis
+import asyncio
 import base64
+import importlib
+import itertools
+import json
 import os
 import requests
+import secrets
+import time
 
-app = FastAPI()
-
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
+MQTT_BROKER = os.getenv("MQTT_BROKER", "broker.hivemq.com")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_TOPIC = "access-control/iot"
-CALENDAR_API_URL = "http://mock-calendar:8081/api"  # Mock calendar endpoint
+CALENDAR_API_URL = os.getenv("CALENDAR_API_URL", "http://mock-calendar:8081/api")  # Mock calendar endpoint
+AI_ENGINE_URL = os.getenv("AI_ENGINE_URL", "http://ai-engine:8004")
+opt_out_tracking = os.getenv("OPT_OUT_TRACKING", "false").lower() == "true"
+GRAPHQL_URL = os.getenv("GRAPHQL_URL", "http://graphql:8000")
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN", "")
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")  # Shared by attendance, catering and access-control
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+# Heavy modules and the MQTT connection load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") == "1"
+HEAVY_MODULES = ["cv2", "pandas", "pyarrow.dataset", "pyarrow.parquet"]
 
 # Database Models
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class AccessRule(Base):
     __tablename__ = "access_rules"
@@ -56,8 +76,6 @@ class ParkingSpot(Base):
     is_occupied = Column(Boolean, default=False)
     user_id = Column(Integer, nullable=True)
 
-Base.metadata.create_all(bind=engine)
-
 # Pydantic Models
 class AccessRuleCreate(BaseModel):
     user_id: int
@@ -81,6 +99,19 @@ class ParkingReservation(BaseModel):
     user_id: int
     spot_number: int
 
+# Dependency
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def require_service_token(x_service_token: Optional[str] = Header(None)):
+    # Called by the attendance service; nginx exposes these routes too, so they need the shared secret
+    if not SERVICE_TOKEN or not secrets.compare_digest(x_service_token or "", SERVICE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid service token")
+
 # Encryption
 def encrypt_data(data: str, key: bytes = b"your-32-byte-key-here-1234567890") -> str:
     cipher = AES.new(key, AES.MODE_CBC)
@@ -90,9 +121,38 @@ def encrypt_data(data: str, key: bytes = b"your-32-byte-key-here-1234567890") ->
     return f"{iv}:{ct}"
 
 # MQTT Setup
-mqtt_client = mqtt_client.Client()
-mqtt_client.connect(MQTT_BROKER, MQTT_PORT)
-mqtt_client.subscribe(MQTT_TOPIC)
+mqtt_client = None
+
+def get_mqtt_client():
+    global mqtt_client
+    if mqtt_client is None:
+        from paho.mqtt import client as mqtt
+        client = mqtt.Client()
+        client.connect(MQTT_BROKER, MQTT_PORT)
+        client.subscribe(MQTT_TOPIC)
+        mqtt_client = client
+    return mqtt_client
+
+def publish_mqtt(message: str):
+    with external_call("mqtt"):
+        get_mqtt_client().publish(MQTT_TOPIC, message)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Base.metadata.create_all(bind=engine)
+    if not LAZY_STARTUP:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+        get_mqtt_client()
+    loop_monitor = instrumentation.start_loop_monitor()
+    yield
+    loop_monitor.cancel()
+    await close_live_redis()
+    if mqtt_client is not None:
+        mqtt_client.disconnect()
+
+app = FastAPI(lifespan=lifespan)
+instrumentation.instrument(app, engine)
 
 # Recognition (Placeholders)
 def recognize_plate(image: np.ndarray) -> str:
@@ -109,10 +169,56 @@ def verify_multi_person(images: List[np.ndarray], stored_encodings: List[str]) -
 # Calendar Integration
 def link_visitor_to_meeting(visitor_id: int, meeting_id: int):
     try:
-        requests.post(f"{CALENDAR_API_URL}/meetings/{meeting_id}/visitors", json={"visitor_id": visitor_id})
+        with external_call("calendar"):
+            requests.post(f"{CALENDAR_API_URL}/meetings/{meeting_id}/visitors", json={"visitor_id": visitor_id})
     except:
         pass  # Mock integration
 
+# GraphQL cache invalidation
+pending_invalidations = set()
+
+def post_invalidation(types: List[str], user_ids: List[int]):
+    try:
+        with external_call("graphql"):
+            requests.post(f"{GRAPHQL_URL}/cache/invalidate", json={"types": types, "user_ids": user_ids}, headers={"X-Invalidation-Token": CACHE_INVALIDATION_TOKEN}, timeout=0.5)
+    except:
+        pass  # Entries expire by TTL anyway
+
+def invalidate_graphql_cache(types: List[str], user_ids: List[int]):
+    # Fire and forget on a worker thread, so a slow or unreachable gateway never stalls the event loop
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(post_invalidation, types, user_ids))
+    pending_invalidations.add(task)
+    task.add_done_callback(pending_invalidations.discard)
+
+# Live feed
+LIVE_RETRY_SECONDS = float(os.getenv("LIVE_RETRY_SECONDS", "5"))
+live_redis = None
+live_redis_retry_at = 0.0
+pending_live_events = set()
+
+async def send_live_event(channel: str, message: str):
+    global live_redis, live_redis_retry_at
+    try:
+        if live_redis is None:
+            live_redis = aioredis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        await live_redis.publish(channel, message)
+    except:
+        live_redis_retry_at = time.monotonic() + LIVE_RETRY_SECONDS  # Dashboards resync on reconnect
+
+async def close_live_redis():
+    global live_redis
+    if live_redis is not None:
+        await live_redis.close()
+        live_redis = None
+
+def publish_live_event(topic: str, op: str, data: dict):
+    # Fire and forget on the asyncio client; while Redis is unreachable, skip instead of reconnecting on every write
+    if time.monotonic() < live_redis_retry_at:
+        return
+    task = asyncio.get_running_loop().create_task(send_live_event(f"live:{topic}", json.dumps({"op": op, "data": data}, default=str)))
+    pending_live_events.add(task)
+    task.add_done_callback(pending_live_events.discard)
+
 # Routes
 @app.post("/access-rules/")
 async def create_access_rule(rule: AccessRuleCreate, db: Session = Depends(get_db)):
@@ -120,9 +226,10 @@ async def create_access_rule(rule: AccessRuleCreate, db: Session = Depends(get_d
     db.add(db_rule)
     db.commit()
     # AI-suggested rules
-    response = requests.post("http://ai-engine:8004/detect-fraud/", json={"user_id": rule.user_id, "attendance_data": []})
+    with external_call("ai-engine"):
+        response = requests.post(f"{AI_ENGINE_URL}/detect-fraud/", json={"user_id": rule.user_id, "attendance_data": []})
     if response.json()["fraud"]:
-        mqtt_client.publish(MQTT_TOPIC, f"Suspicious rule for user {rule.user_id}")
+        publish_mqtt(f"Suspicious rule for user {rule.user_id}")
     db.refresh(db_rule)
     return rule
 
@@ -133,7 +240,9 @@ async def log_access(log: AccessLogCreate, db: Session = Depends(get_db)):
         db_log = AccessLog(**log.dict())
         db.add(db_log)
         db.commit()
-        mqtt_client.publish(MQTT_TOPIC, f"Access: {log.user_id} at {log.location}")
+        invalidate_graphql_cache(["AccessLog"], [log.user_id])
+        publish_live_event("access", "insert", {"id": db_log.id, "user_id": db_log.user_id, "location": db_log.location, "timestamp": db_log.timestamp, "is_vehicle": db_log.is_vehicle})
+        publish_mqtt(f"Access: {log.user_id} at {log.location}")
     return {"status": "logged"}
 
 @app.post("/visitors/")
@@ -158,11 +267,18 @@ async def reserve_parking(reservation: ParkingReservation, db: Session = Depends
     raise HTTPException(status_code=400, detail="Spot unavailable")
 
 @app.get("/access-logs/")
-async def get_access_logs(db: Session = Depends(get_db)):
-    return db.query(AccessLog).all()
+async def get_access_logs(user_id: Optional[List[int]] = Query(None), skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db)):
+    q = db.query(AccessLog)
+    if user_id:
+        q = q.filter(AccessLog.user_id.in_(user_id))
+    q = q.order_by(AccessLog.id).offset(skip)
+    if limit is not None:
+        q = q.limit(limit)
+    return q.all()
 
 @app.post("/verify-plate/")
 async def verify_plate(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    import cv2
     image_data = await file.read()
     nparr = np.frombuffer(image_data, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
@@ -171,6 +287,7 @@ async def verify_plate(file: UploadFile = File(...), db: Session = Depends(get_d
 
 @app.post("/verify-faces/")
 async def verify_faces(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    import cv2
     images = [cv2.imdecode(np.frombuffer(await f.read(), np.uint8), cv2.IMREAD_COLOR) for f in files]
     users = db.query(User).all()
     results = verify_multi_person(images, [u.face_encoding for u in users])
@@ -178,7 +295,7 @@ async def verify_faces(files: List[UploadFile] = File(...), db: Session = Depend
 
 @app.post("/emergency/fire-alarm/")
 async def fire_alarm(db: Session = Depends(get_db)):
-    mqtt_client.publish(MQTT_TOPIC, "Fire alarm: Open all doors")
+    publish_mqtt("Fire alarm: Open all doors")
     return {"status": "doors opened"}
 
 @app.get("/emergency/headcount/")
@@ -189,5 +306,61 @@ async def headcount(db: Session = Depends(get_db)):
 # (Add to existing main.py)
 @app.post("/energy-optimization/")
 async def optimize_energy(state: bool):
-    mqtt_client.publish(MQTT_TOPIC, f"Device power: {'on' if state else 'off'}")
-    return {"status": "optimized"}
\ No newline at end of file
+    publish_mqtt(f"Device power: {'on' if state else 'off'}")
+    return {"status": "optimized"}
+
+# Cold archive
+ACCESS_LOG_ARCHIVE = ArchivedTable(AccessLog.__table__)
+
+# Archive scans and rewrites: plain def so FastAPI runs these in its threadpool instead of on the event loop
+@app.post("/archive/run", dependencies=[Depends(require_service_token)])
+def run_archive(db: Session = Depends(get_db)):
+    return archive.run_archival(db, ACCESS_LOG_ARCHIVE)
+
+@app.get("/archive/verify", dependencies=[Depends(require_service_token)])
+def verify_archive(deep: bool = False, db: Session = Depends(get_db)):
+    return archive.verify(db, ACCESS_LOG_ARCHIVE, deep)
+
+@app.get("/analytics/access-logs", dependencies=[Depends(require_service_token)])
+def access_log_analytics(start: datetime, end: datetime, user_id: Optional[List[int]] = Query(None), location: Optional[str] = None, group_by: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(1000, ge=0), db: Session = Depends(get_db)):
+    if group_by not in (None, "user", "day", "month", "location"):
+        raise HTTPException(status_code=400, detail="group_by must be user, day, month or location")
+    frame = archive.scan(db, ACCESS_LOG_ARCHIVE, start, end, user_id)
+    if location:
+        frame = frame[frame["location"] == location]
+    if group_by:
+        frame = frame.groupby(archive.group_key(frame, ACCESS_LOG_ARCHIVE, group_by)).agg(
+            events=("id", "size"),
+            users=("user_id", "nunique"),
+            vehicles=("is_vehicle", "sum"),
+            archived=("archived", "sum"),
+        ).reset_index()
+    return {"total": len(frame), "rows": archive.records(frame.iloc[skip:skip + limit])}
+
+GDPR_TARGETS = [
+    Target("access_logs", AccessLog),
+    Target("access_rules", AccessRule, action="delete"),
+    Target("parking_spots", ParkingSpot, action="anonymize", scrub={"is_occupied": False}),
+]
+
+class ErasureRequest(BaseModel):
+    user_id: int
+    mode: str = "delete"
+    batch_size: int = gdpr.BATCH_SIZE
+
+@app.post("/gdpr/erase", dependencies=[Depends(require_service_token)])
+def erase_user_data(request: ErasureRequest, db: Session = Depends(get_db)):
+    if request.mode not in ("delete", "anonymize"):
+        raise HTTPException(status_code=400, detail="mode must be delete or anonymize")
+    result = gdpr.erase_next_batch(db, GDPR_TARGETS, request.user_id, request.mode, request.batch_size)
+    if result["done"]:
+        # Hot rows are gone; archived ones are rewritten in one pass
+        archived = archive.erase_user(db, ACCESS_LOG_ARCHIVE, request.user_id, request.mode)
+        if archived:
+            result.update({"table": "access_logs_archive", "processed": archived})
+    return result
+
+@app.get("/gdpr/export/{user_id}", dependencies=[Depends(require_service_token)])
+async def export_user_data(user_id: int):
+    rows = itertools.chain(gdpr.export_rows(GDPR_TARGETS, user_id), archive.export_rows(ACCESS_LOG_ARCHIVE, user_id))
+    return StreamingResponse(rows, media_type="application/x-ndjson")
\ No newline at end of file
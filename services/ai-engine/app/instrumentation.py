@@ -0,0 +1,209 @@
+"""Prometheus metrics and an on-demand sampling profiler shared by every service.
+
+Each service keeps an identical copy of this module (the images only ship their own
+app/ directory). ``instrument(app, engine)`` adds:
+
+- ``GET /metrics``: Prometheus text format
+- ``GET /debug/profile?seconds=N``: folded stacks of the live worker, for
+  flamegraph.pl or speedscope. Disabled unless PROFILER_TOKEN is set.
+
+Request latency is recorded per route template, so path parameters do not create
+new series. Database and external-call timings are attributed to the current request
+through a context variable.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Mount
+
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to response headers", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled", ["method"])
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries issued per request", ["route"], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500))
+DB_QUERIES = Counter("db_queries_total", "Database queries", ["operation"])
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database query time", ["operation"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+EXTERNAL_LATENCY = Histogram("external_call_duration_seconds", "Calls to other services and third parties", ["target", "outcome"])
+LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+LOOP_LAG_HISTOGRAM = Histogram("event_loop_lag_distribution_seconds", "Event loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+# Requests
+class MetricsMiddleware:
+    """Pure ASGI so streaming responses pass through untouched."""
+
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = routes
+
+    def route_label(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        path = scope.get("path", "")
+        for mount in self.routes:
+            if isinstance(mount, Mount) and path.startswith(mount.path or "/"):
+                return (mount.path or "") + "/*"
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        started = time.perf_counter()
+        queries = [0]
+        token = _request_queries.set(queries)
+        recorded = False
+
+        async def send_wrapper(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                route = self.route_label(scope)
+                REQUEST_LATENCY.labels(method, route, str(message["status"])).observe(time.perf_counter() - started)
+                REQUEST_QUERIES.labels(route).observe(queries[0])
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not recorded:
+                REQUEST_LATENCY.labels(method, self.route_label(scope), "500").observe(time.perf_counter() - started)
+            raise
+        finally:
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            _request_queries.reset(token)
+
+# Database
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            operation = "OTHER"
+        DB_QUERIES.labels(operation).inc()
+        DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+# External calls
+@contextmanager
+def external_call(target: str):
+    """Times a call to another service; works for both sync and awaited calls."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_LATENCY.labels(target, "error").observe(time.perf_counter() - started)
+        raise
+    EXTERNAL_LATENCY.labels(target, "ok").observe(time.perf_counter() - started)
+
+# Event loop lag
+async def monitor_loop_lag(interval: Optional[float] = None):
+    interval = interval or LOOP_LAG_INTERVAL
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
+
+def start_loop_monitor() -> asyncio.Task:
+    return asyncio.get_running_loop().create_task(monitor_loop_lag())
+
+# Sampling profiler
+class Sampler:
+    """Samples every thread's stack at a fixed interval from a background thread.
+
+    Nothing runs between profiles; while sampling, the cost is one
+    ``sys._current_frames()`` walk per interval.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = FrameCounter()
+        self.samples = 0
+
+    @staticmethod
+    def folded(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def run(self, seconds: float):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[f"{names.get(ident, ident)};{self.folded(frame)}"] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def render(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+_profile_lock = threading.Lock()
+
+def profile(seconds: float, interval: float) -> Sampler:
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        sampler = Sampler(interval)
+        sampler.run(seconds)
+        return sampler
+    finally:
+        _profile_lock.release()
+
+def instrument(app: FastAPI, engine=None):
+    """Call right after creating the app, before any catch-all mount."""
+    if engine is not None:
+        instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    @app.get("/debug/profile", include_in_schema=False)
+    async def debug_profile(seconds: float = Query(10, gt=0), interval: float = Query(0.005, ge=0.001), x_profiler_token: Optional[str] = Header(None)):
+        if not PROFILER_TOKEN or x_profiler_token != PROFILER_TOKEN:
+            raise HTTPException(status_code=403, detail="Profiler disabled or invalid token")
+        try:
+            sampler = await asyncio.to_thread(profile, min(seconds, PROFILER_MAX_SECONDS), interval)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        return PlainTextResponse(sampler.render(), headers={"X-Profile-Samples": str(sampler.samples)})
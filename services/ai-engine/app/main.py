@@ -1,12 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from pydantic import BaseModel
 from typing import List
+import importlib
+import instrumentation
 import numpy as np
-from sklearn.cluster import KMeans
-from prophet import Prophet
-import pandas as pd
+import os
 
-app = FastAPI()
+# Heavy modules load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") == "1"
+HEAVY_MODULES = ["pandas", "sklearn.cluster", "prophet"]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not LAZY_STARTUP:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+    loop_monitor = instrumentation.start_loop_monitor()
+    yield
+    loop_monitor.cancel()
+
+app = FastAPI(lifespan=lifespan)
+instrumentation.instrument(app)
 
 class ShiftData(BaseModel):
     employee_id: int
@@ -22,6 +37,7 @@ class DemandPrediction(BaseModel):
 
 @app.post("/optimize-shifts/")
 async def optimize_shifts(data: List[ShiftData]):
+    from sklearn.cluster import KMeans
     X = np.array([[d.workload, len(d.availability)] for d in data])
     kmeans = KMeans(n_clusters=3)
     kmeans.fit(X)
@@ -29,6 +45,7 @@ async def optimize_shifts(data: List[ShiftData]):
 
 @app.post("/detect-fraud/")
 async def detect_fraud(data: FraudDetection):
+    import pandas as pd
     timestamps = [pd.to_datetime(t["timestamp"]) for t in data.attendance_data]
     if len(timestamps) < 2:
         return {"fraud": False}
@@ -40,6 +57,8 @@ async def detect_fraud(data: FraudDetection):
 
 @app.post("/predict-demand/")
 async def predict_demand(data: DemandPrediction):
+    import pandas as pd
+    from prophet import Prophet
     df = pd.DataFrame(data.historical_data)
     df['ds'] = pd.to_datetime(df['date'])
     df['y'] = df['value']
@@ -0,0 +1,194 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "62"))
+INDEX_TTL = int(os.getenv("AVAILABILITY_INDEX_TTL", "900"))
+WORKLOAD_MARGIN = timedelta(days=3)
+BUILD_CHUNK = 2048
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+Interval = Tuple[int, datetime, datetime]
+
+def naive_utc(t: datetime) -> datetime:
+    """The index works in naive UTC, like the database columns; aware inputs (``...Z``) are converted."""
+    return t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo is not None else t
+
+def to_slots(origin: datetime, times: Sequence[datetime], round_up: bool = False) -> np.ndarray:
+    # Timedelta floor division is markedly faster than numpy's datetime64 conversion of Python datetimes
+    minute = timedelta(minutes=1)
+    minutes = np.fromiter(((t - origin) // minute for t in times), dtype=np.int64, count=len(times))
+    if round_up:
+        return -(-minutes // SLOT_MINUTES)
+    return minutes // SLOT_MINUTES
+
+def pack_intervals(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, n_rows: int, n_slots: int) -> np.ndarray:
+    """Rasterizes ``[start, end)`` slot intervals into a per-row bitmap packed 8 slots per byte."""
+    starts = np.clip(starts, 0, n_slots)
+    ends = np.clip(ends, 0, n_slots)
+    keep = ends > starts
+    rows, starts, ends = rows[keep], starts[keep], ends[keep]
+    packed = np.zeros((n_rows, (n_slots + 7) // 8), dtype=np.uint8)
+    # Difference array + cumsum per block of rows keeps the temporary int16 matrix bounded
+    for lo in range(0, n_rows, BUILD_CHUNK):
+        hi = min(lo + BUILD_CHUNK, n_rows)
+        in_block = (rows >= lo) & (rows < hi)
+        diff = np.zeros((hi - lo, n_slots + 1), dtype=np.int16)
+        np.add.at(diff, (rows[in_block] - lo, starts[in_block]), 1)
+        np.add.at(diff, (rows[in_block] - lo, ends[in_block]), -1)
+        packed[lo:hi] = np.packbits(np.cumsum(diff[:, :-1], axis=1, dtype=np.int16) > 0, axis=1)
+    return packed
+
+class AvailabilityIndex:
+    """Per-user shift and approved-leave bitmaps over ``days`` days of ``SLOT_MINUTES`` slots.
+
+    Rows are users, columns are slots packed into bytes, so "who is busy in this
+    window" is one AND over a few bytes per user.
+    """
+
+    def __init__(self, origin: datetime, days: int, user_ids: np.ndarray, roles: np.ndarray, shifts: np.ndarray, leaves: np.ndarray):
+        self.origin = origin
+        self.days = days
+        self.n_slots = days * SLOTS_PER_DAY
+        self.user_ids = user_ids
+        self.roles = roles
+        self.shifts = shifts
+        self.leaves = leaves
+        self.built_at = time.monotonic()
+        self.position: Dict[int, int] = {int(user_id): i for i, user_id in enumerate(user_ids)}
+
+    @classmethod
+    def build(cls, origin: datetime, days: int, users: Iterable[Tuple[int, str]], shifts: Iterable[Interval], leaves: Iterable[Interval]) -> "AvailabilityIndex":
+        users = sorted(users)
+        user_ids = np.array([u[0] for u in users], dtype=np.int64)
+        roles = np.array([u[1] or "employee" for u in users], dtype=object)
+        n_slots = days * SLOTS_PER_DAY
+        return cls(origin, days, user_ids, roles, cls._pack(origin, user_ids, shifts, n_slots), cls._pack(origin, user_ids, leaves, n_slots))
+
+    @staticmethod
+    def _pack(origin: datetime, user_ids: np.ndarray, intervals: Iterable[Interval], n_slots: int) -> np.ndarray:
+        intervals = [i for i in intervals if i[1] is not None and i[2] is not None]
+        if not intervals:
+            return np.zeros((len(user_ids), (n_slots + 7) // 8), dtype=np.uint8)
+        owners = np.array([i[0] for i in intervals], dtype=np.int64)
+        rows = np.searchsorted(user_ids, owners)
+        known = (rows < len(user_ids)) & (user_ids[np.minimum(rows, len(user_ids) - 1)] == owners)
+        starts = to_slots(origin, [i[1] for i in intervals])
+        ends = to_slots(origin, [i[2] for i in intervals], round_up=True)
+        return pack_intervals(rows[known], starts[known], ends[known], len(user_ids), n_slots)
+
+    @property
+    def end(self) -> datetime:
+        return self.origin + timedelta(days=self.days)
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        return self.origin <= naive_utc(start) and naive_utc(end) <= self.end
+
+    def _window(self, start: datetime, end: datetime) -> Tuple[int, int, np.ndarray]:
+        start, end = naive_utc(start), naive_utc(end)
+        first = int(np.clip(to_slots(self.origin, [start])[0], 0, self.n_slots))
+        last = int(np.clip(to_slots(self.origin, [end], round_up=True)[0], first, self.n_slots))
+        b0, b1 = first // 8, max((last + 7) // 8, first // 8)
+        bits = np.zeros((b1 - b0) * 8, dtype=bool)
+        bits[first - b0 * 8:last - b0 * 8] = True
+        return b0, b1, np.packbits(bits)
+
+    def _overlaps(self, bitmap: np.ndarray, start: datetime, end: datetime) -> np.ndarray:
+        b0, b1, mask = self._window(start, end)
+        return (bitmap[:, b0:b1] & mask).any(axis=1)
+
+    def on_leave(self, start: datetime, end: datetime) -> np.ndarray:
+        return self._overlaps(self.leaves, start, end)
+
+    def busy(self, start: datetime, end: datetime, slots: Optional[np.ndarray] = None) -> np.ndarray:
+        """Users with a shift or approved leave in the window, or only in its ``slots`` (a packed bitmap row) if given."""
+        b0, b1, mask = self._window(start, end)
+        if slots is not None:
+            mask = mask & slots[b0:b1]
+        return ((self.shifts[:, b0:b1] | self.leaves[:, b0:b1]) & mask).any(axis=1)
+
+    def workload(self, start: datetime, end: datetime) -> np.ndarray:
+        """Scheduled shift slots per user in ``[start, end)``."""
+        b0, b1, mask = self._window(start, end)
+        return POPCOUNT[self.shifts[:, b0:b1] & mask].sum(axis=1)
+
+    def free_users(self, start: datetime, end: datetime, role: Optional[str] = None, exclude: Iterable[int] = (), limit: Optional[int] = None, slots: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """Users with no shift or approved leave in the window (or its ``slots``), least loaded first, as ``(user_id, workload_slots)``."""
+        candidates = ~self.busy(start, end, slots)
+        if role is not None:
+            candidates &= self.roles == role
+        else:
+            candidates &= self.roles != "hr"
+        for user_id in exclude:
+            if user_id in self.position:
+                candidates[self.position[user_id]] = False
+        rows = np.flatnonzero(candidates)
+        load = self.workload(start - WORKLOAD_MARGIN, end + WORKLOAD_MARGIN)[rows]
+        order = np.lexsort((self.user_ids[rows], load))[:limit]
+        return [(int(self.user_ids[rows[i]]), int(load[i])) for i in order]
+
+    def find_substitutes(self, user_id: int, start: datetime, end: datetime, limit: int = 5) -> List[Tuple[int, int]]:
+        """Same-role users free during the requester's own shifts in the window (the whole window if they have none)."""
+        row = self.position.get(user_id)
+        role = self.roles[row] if row is not None else None
+        slots = None
+        if row is not None:
+            b0, b1, mask = self._window(start, end)
+            if (self.shifts[row, b0:b1] & mask).any():
+                slots = self.shifts[row]
+        return self.free_users(start, end, role=role, exclude=[user_id], limit=limit, slots=slots)
+
+    def team_overlaps(self, user_id: int, start: datetime, end: datetime) -> List[int]:
+        """Teammates (same role) with approved leave overlapping the window."""
+        if user_id not in self.position:
+            return []
+        overlapping = self.on_leave(start, end) & (self.roles == self.roles[self.position[user_id]])
+        overlapping[self.position[user_id]] = False
+        return [int(u) for u in self.user_ids[overlapping]]
+
+    def add_interval(self, kind: str, user_id: int, start: datetime, end: datetime) -> bool:
+        """Marks a new shift or approved leave in place; returns False if the user is not indexed."""
+        if user_id not in self.position:
+            return False
+        bitmap = self.shifts if kind == "shift" else self.leaves
+        row = self.position[user_id]
+        start, end = naive_utc(start), naive_utc(end)
+        bitmap[row] |= pack_intervals(np.zeros(1, dtype=np.int64), to_slots(self.origin, [start]), to_slots(self.origin, [end], round_up=True), 1, self.n_slots)[0]
+        return True
+
+class IndexCache:
+    """Keeps one index over ``[yesterday, yesterday + horizon)`` and rebuilds it when stale.
+
+    Windows outside the horizon get a one-off index covering just that window.
+    """
+
+    def __init__(self, loader: Callable[..., AvailabilityIndex], ttl: int = INDEX_TTL, horizon_days: int = HORIZON_DAYS):
+        self.loader = loader
+        self.ttl = ttl
+        self.horizon_days = horizon_days
+        self.index: Optional[AvailabilityIndex] = None
+
+    def get(self, db, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AvailabilityIndex:
+        origin = datetime.combine(datetime.utcnow().date(), datetime.min.time()) - timedelta(days=1)
+        horizon_end = origin + timedelta(days=self.horizon_days)
+        if start is not None and end is not None:
+            start, end = naive_utc(start), naive_utc(end)
+            if not (origin <= start - WORKLOAD_MARGIN and end + WORKLOAD_MARGIN <= horizon_end):
+                window_origin = datetime.combine((start - WORKLOAD_MARGIN).date(), datetime.min.time())
+                return self.loader(db, window_origin, (end + WORKLOAD_MARGIN - window_origin).days + 1)
+        if self.index is None or self.index.origin != origin or time.monotonic() - self.index.built_at > self.ttl:
+            self.index = self.loader(db, origin, self.horizon_days)
+        return self.index
+
+    def record(self, kind: str, user_id: int, start: datetime, end: datetime):
+        if self.index is not None and not self.index.add_interval(kind, user_id, start, end):
+            self.invalidate()
+
+    def invalidate(self):
+        self.index = None
@@ -1,17 +1,263 @@
+import json
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from sqlalchemy import Column, DateTime, Integer, String, and_, or_
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from fastapi import HTTPException
 
-def delete_user_data(user_id: int):
+from database import SessionLocal, Base
+
+BATCH_SIZE = int(os.getenv("GDPR_BATCH_SIZE", "1000"))
+LEASE_SECONDS = int(os.getenv("GDPR_LEASE_SECONDS", "60"))
+REMOTE_TIMEOUT = float(os.getenv("GDPR_REMOTE_TIMEOUT", "30"))
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")  # Required by the remote /gdpr endpoints
+REMOTE_SERVICES = {
+    "catering": os.getenv("CATERING_URL", "http://catering:8000"),
+    "access-control": os.getenv("ACCESS_CONTROL_URL", "http://access-control:8000"),
+}
+
+class ErasureJob(Base):
+    __tablename__ = "gdpr_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, index=True)
+    mode = Column(String, default="delete")  # delete, anonymize
+    status = Column(String, default="pending")  # pending, running, done, failed
+    step = Column(String, nullable=True)
+    rows_done = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class Target:
+    """A table holding personal data, found through ``user_column``.
+
+    ``action`` forces "delete" or "anonymize" regardless of the job mode; anonymizing
+    clears ``user_column`` and applies ``scrub``.
+    """
+
+    def __init__(self, name: str, model, user_column: str = "user_id", action: Optional[str] = None, scrub: Optional[Dict] = None):
+        self.name = name
+        self.model = model
+        self.user_column = user_column
+        self.action = action
+        self.scrub = scrub or {}
+
+def row_dict(row) -> dict:
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+def erase_batch(db: Session, target: Target, user_id: int, mode: str, batch_size: Optional[int] = None) -> int:
+    """Deletes or anonymizes up to ``batch_size`` of the subject's rows; the caller commits."""
+    batch_size = batch_size or BATCH_SIZE
+    model = target.model
+    column = getattr(model, target.user_column)
+    ids = [row[0] for row in db.query(model.id).filter(column == user_id).order_by(model.id).limit(batch_size)]
+    if not ids:
+        return 0
+    batch = db.query(model).filter(model.id.in_(ids))
+    if (target.action or mode) == "anonymize":
+        batch.update({target.user_column: None, **target.scrub}, synchronize_session=False)
+    else:
+        batch.delete(synchronize_session=False)
+    return len(ids)
+
+def erase_next_batch(db: Session, targets: List[Target], user_id: int, mode: str, batch_size: Optional[int] = None) -> dict:
+    """One bounded, committed batch from the first target that still has rows; safe to repeat after a crash."""
+    for target in targets:
+        processed = erase_batch(db, target, user_id, mode, batch_size)
+        if processed:
+            db.commit()
+            return {"table": target.name, "processed": processed, "done": False}
+    return {"table": None, "processed": 0, "done": True}
+
+def export_rows(targets: List[Target], user_id: int, batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """NDJSON lines for every row of the subject, read in keyset batches."""
+    batch_size = batch_size or BATCH_SIZE
+    db = SessionLocal()
+    try:
+        for target in targets:
+            model = target.model
+            column = getattr(model, target.user_column)
+            last_id = 0
+            while True:
+                rows = db.query(model).filter(column == user_id, model.id > last_id).order_by(model.id).limit(batch_size).all()
+                if not rows:
+                    break
+                for row in rows:
+                    yield (json.dumps({"table": target.name, "row": row_dict(row)}, default=str) + "\n").encode()
+                last_id = rows[-1].id
+                db.expunge_all()
+    finally:
+        db.close()
+
+# Orchestration
+def claim_job(db: Session, job_id: int) -> Optional[ErasureJob]:
+    """Atomically takes a pending job, or a running one whose worker stopped heartbeating."""
+    now = datetime.utcnow()
+    claimed = db.query(ErasureJob).filter(
+        ErasureJob.id == job_id,
+        or_(
+            ErasureJob.status == "pending",
+            and_(ErasureJob.status == "running", or_(ErasureJob.heartbeat_at.is_(None), ErasureJob.heartbeat_at < now - timedelta(seconds=LEASE_SECONDS))),
+        ),
+    ).update({"status": "running", "heartbeat_at": now}, synchronize_session=False)
+    db.commit()
+    return db.query(ErasureJob).filter(ErasureJob.id == job_id).first() if claimed else None
+
+def erase_remote(service: str, user_id: int, mode: str) -> dict:
+    response = requests.post(
+        f"{REMOTE_SERVICES[service]}/gdpr/erase",
+        json={"user_id": user_id, "mode": mode, "batch_size": BATCH_SIZE},
+        headers={"X-Service-Token": SERVICE_TOKEN},
+        timeout=REMOTE_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+def run_erasure(job_id: int, targets: List[Target], erase_subject: Callable[[Session, int, str], None]):
+    """Walks local targets, remote services, then the user row, checkpointing after every batch.
+
+    The step name is persisted so a restarted worker resumes where the last one stopped.
+    """
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        db.query(Attendance).filter(Attendance.user_id == user_id).delete()
-        db.query(Leave).filter(Leave.user_id == user_id).delete()
-        db.delete(user)
-        db.commit()
-        return {"status": "deleted"}
+        job = claim_job(db, job_id)
+        if job is None:
+            return
+        steps = [target.name for target in targets] + list(REMOTE_SERVICES) + ["users"]
+        by_name = {target.name: target for target in targets}
+        start = steps.index(job.step) if job.step in steps else 0
+        try:
+            for step in steps[start:]:
+                job.step = step
+                job.heartbeat_at = datetime.utcnow()
+                db.commit()
+                while True:
+                    if step in by_name:
+                        processed = erase_batch(db, by_name[step], job.user_id, job.mode)
+                        done = processed == 0
+                    elif step in REMOTE_SERVICES:
+                        result = erase_remote(step, job.user_id, job.mode)
+                        processed, done = result["processed"], result["done"]
+                    else:
+                        erase_subject(db, job.user_id, job.mode)
+                        processed, done = 1, True
+                    # Progress is committed with (or right after) the batch it describes
+                    job.rows_done += processed
+                    job.heartbeat_at = datetime.utcnow()
+                    db.commit()
+                    if done:
+                        break
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(exc)[:500]
+            db.commit()
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def start_erasure(job_id: int, targets: List[Target], erase_subject: Callable[[Session, int, str], None]):
+    threading.Thread(target=run_erasure, args=(job_id, targets, erase_subject), daemon=True).start()
+
+def resume_stalled_jobs(targets: List[Target], erase_subject: Callable[[Session, int, str], None]):
+    db = SessionLocal()
+    try:
+        job_ids = [row[0] for row in db.query(ErasureJob.id).filter(ErasureJob.status.in_(["pending", "running"]))]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        start_erasure(job_id, targets, erase_subject)
+
+def job_progress(job: ErasureJob) -> dict:
+    end = job.finished_at or job.heartbeat_at or job.started_at
+    elapsed = max((end - job.started_at).total_seconds(), 1e-6)
+    return {
+        "id": job.id,
+        "user_id": job.user_id,
+        "mode": job.mode,
+        "status": job.status,
+        "step": job.step,
+        "rows_done": job.rows_done,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(job.rows_done / elapsed, 1),
+        "error": job.error,
+    }
+
+# Subject-access export
+def remote_export(service: str, user_id: int) -> Iterator[bytes]:
+    with requests.get(f"{REMOTE_SERVICES[service]}/gdpr/export/{user_id}", headers={"X-Service-Token": SERVICE_TOKEN}, stream=True, timeout=REMOTE_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield line + b"\n"
+
+def export_sources(targets: List[Target], user_id: int, subject: Callable[[], Iterable[bytes]]) -> Dict[str, Callable[[], Iterable[bytes]]]:
+    sources = {"attendance": lambda: _chain(subject(), export_rows(targets, user_id))}
+    for service in REMOTE_SERVICES:
+        sources[service] = lambda service=service: remote_export(service, user_id)
+    return sources
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+class _StreamBuffer:
+    """Write-only sink for ``zipfile``; being unseekable makes it emit data descriptors."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def stream_export(sources: Dict[str, Callable[[], Iterable[bytes]]], fmt: str = "ndjson") -> Iterator[bytes]:
+    """Streams every source as NDJSON (with a trailing summary line) or as a ZIP of ``<source>.ndjson`` files."""
+    started = time.perf_counter()
+    counts = {}
+    size = 0
+    buffer = _StreamBuffer()
+    archive = zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) if fmt == "zip" else None
+    for name, source in sources.items():
+        counts[name] = 0
+        entry = archive.open(f"{name}.ndjson", "w", force_zip64=True) if archive else None
+        for line in source():
+            counts[name] += 1
+            size += len(line)
+            if entry:
+                entry.write(line)
+                chunk = buffer.drain()
+                if chunk:
+                    yield chunk
+            else:
+                yield line
+        if entry:
+            entry.close()
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    summary = {"rows": counts, "bytes": size, "elapsed_seconds": round(elapsed, 3), "rows_per_second": round(sum(counts.values()) / elapsed, 1)}
+    if archive:
+        archive.writestr("manifest.json", json.dumps(summary, indent=2))
+        archive.close()
+        yield buffer.drain()
+    else:
+        yield (json.dumps({"summary": summary}) + "\n").encode()
@@ -1,31 +1,80 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
-import cv2
+from typing import List, Optional, Tuple
 import numpy as np
 from database import SessionLocal, engine, Base
+from availability import AvailabilityIndex, IndexCache, SLOT_MINUTES
+import archive
+from archive import ArchivedTable
+import gdpr
+import instrumentation
+from gdpr import ErasureJob, Target
+from instrumentation import external_call
+import rollups
+from rollups import AttendanceDaily, AttendanceMonthly
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from telegram import Bot
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from redis import asyncio as aioredis
+from datetime import date, datetime, timedelta
+import asyncio
+import importlib
 import io
+import json
+import logging
+import os
 import requests
+import threading
+import time
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 TELEGRAM_BOT_TOKEN = "your-telegram-bot-token"
 TELEGRAM_CHAT_ID = "your-chat-id"
-JIRA_API_URL = "http://mock-jira:8080/api"  # Mock Jira endpoint
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+JIRA_API_URL = os.getenv("JIRA_API_URL", "http://mock-jira:8080/api")  # Mock Jira endpoint
+AI_ENGINE_URL = os.getenv("AI_ENGINE_URL", "http://ai-engine:8004")
+GRAPHQL_URL = os.getenv("GRAPHQL_URL", "http://graphql:8000")
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN", "")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+LIVE_TOKEN_SECRET = os.getenv("LIVE_TOKEN_SECRET", "")  # Shared with the GraphQL gateway
+LIVE_TOKEN_TTL = int(os.getenv("LIVE_TOKEN_TTL", "60"))
+# Heavy modules and clients load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") == "1"
+HEAVY_MODULES = ["cv2", "pandas", "pyarrow.dataset", "pyarrow.parquet", "reportlab.pdfgen.canvas", "telegram"]
 
-app = FastAPI()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-telegram_bot = Bot(token=TELEGRAM_BOT_TOKEN)
+logger = logging.getLogger(__name__)
+telegram_bot = None
+
+def get_telegram_bot():
+    global telegram_bot
+    if telegram_bot is None:
+        from telegram import Bot
+        telegram_bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL)
+    return telegram_bot
+
+async def send_telegram(text: str):
+    try:
+        with external_call("telegram"):
+            await get_telegram_bot().send_message(chat_id=TELEGRAM_CHAT_ID, text=text)
+    except:
+        pass  # Notifications are best effort
+
+pending_notifications = set()
+
+def notify_telegram(text: str):
+    # Fire and forget, so requests neither wait on Telegram nor hold a pooled DB connection meanwhile
+    task = asyncio.get_running_loop().create_task(send_telegram(text))
+    pending_notifications.add(task)
+    task.add_done_callback(pending_notifications.discard)
 
 # Database Models
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey
@@ -69,8 +118,6 @@ class Shift(Base):
     end_time = Column(DateTime)
     is_remote = Column(Boolean, default=False)
 
-Base.metadata.create_all(bind=engine)
-
 # Pydantic Models
 class UserCreate(BaseModel):
     name: str
@@ -125,6 +172,94 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
+# Staffing Availability
+def load_availability(db: Session, origin: datetime, days: int) -> AvailabilityIndex:
+    horizon_end = origin + timedelta(days=days)
+    users = db.query(User.id, User.role).all()
+    shifts = db.query(Shift.user_id, Shift.start_time, Shift.end_time).filter(Shift.end_time > origin, Shift.start_time < horizon_end).all()
+    leaves = db.query(Leave.user_id, Leave.start_date, Leave.end_date).filter(Leave.status == "approved", Leave.end_date > origin, Leave.start_date < horizon_end).all()
+    return AvailabilityIndex.build(origin, days, users, shifts, leaves)
+
+availability_index = IndexCache(load_availability)
+
+# Cold archive
+ATTENDANCE_ARCHIVE = ArchivedTable(Attendance.__table__)
+
+# Nightly jobs
+NIGHTLY_JOBS = os.getenv("NIGHTLY_JOBS", "true").lower() == "true"
+
+def run_nightly_jobs():
+    # Rollups rewrite the ranges they touch, so a run on every replica is harmless
+    db = SessionLocal()
+    try:
+        rollups.run_incremental(db, Attendance.__table__, archived=ATTENDANCE_ARCHIVE)
+    finally:
+        db.close()
+
+async def nightly_jobs():
+    while True:
+        await asyncio.sleep(rollups.seconds_until_nightly())
+        try:
+            await asyncio.to_thread(run_nightly_jobs)
+        except Exception:
+            logger.exception("Nightly jobs failed; they run again tomorrow")
+
+# GDPR
+GDPR_TARGETS = [
+    Target("attendances", Attendance),
+    Target("leaves", Leave),
+    Target("leaves_as_substitute", Leave, user_column="substitute_id", action="anonymize"),
+    Target("shifts", Shift),
+    Target("attendance_daily", AttendanceDaily),
+    Target("attendance_monthly", AttendanceMonthly),
+]
+
+def erase_subject(db: Session, user_id: int, mode: str):
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return
+    archive.erase_user(db, ATTENDANCE_ARCHIVE, user_id, mode)
+    if mode == "anonymize":
+        user.name = f"erased-{user_id}"
+        user.face_encoding = None
+        user.fingerprint = None
+        user.qr_code = None
+        user.nfc_tag = None
+        user.hashed_password = None
+    else:
+        db.delete(user)
+
+def export_subject(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            row = gdpr.row_dict(user)
+            del row["hashed_password"]
+            yield (json.dumps({"table": "users", "row": row}, default=str) + "\n").encode()
+    finally:
+        db.close()
+    yield from archive.export_rows(ATTENDANCE_ARCHIVE, user_id)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Base.metadata.create_all(bind=engine)
+    if not LAZY_STARTUP:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+        get_telegram_bot()
+    gdpr.resume_stalled_jobs(GDPR_TARGETS, erase_subject)
+    loop_monitor = instrumentation.start_loop_monitor()
+    nightly = asyncio.create_task(nightly_jobs()) if NIGHTLY_JOBS else None
+    yield
+    loop_monitor.cancel()
+    if nightly:
+        nightly.cancel()
+    await close_live_redis()
+
+app = FastAPI(lifespan=lifespan)
+instrumentation.instrument(app, engine)
+
 # Verification Functions (Placeholders)
 def verify_face(image: np.ndarray, stored_encoding: str) -> bool:
     return True
@@ -149,11 +284,83 @@ def calculate_penalties_rewards(attendance: Attendance, shift: Shift) -> tuple:
     return 0.0, 0.0
 
 # Jira Integration
-def log_task_hours(user_id: int, hours: float):
+JIRA_TIMEOUT = float(os.getenv("JIRA_TIMEOUT", "10"))
+JIRA_CONCURRENCY = int(os.getenv("JIRA_CONCURRENCY", "16"))
+JIRA_BATCH_SIZE = int(os.getenv("JIRA_BATCH_SIZE", "500"))
+jira_exports = {}
+
+def log_task_hours(user_id: int, hours: float, day: Optional[date] = None, session=requests) -> bool:
     try:
-        requests.post(f"{JIRA_API_URL}/tasks", json={"user_id": user_id, "hours": hours})
+        with external_call("jira"):
+            session.post(f"{JIRA_API_URL}/tasks", json={"user_id": user_id, "hours": hours, "date": day.isoformat() if day else None}, timeout=JIRA_TIMEOUT).raise_for_status()
+        return True
     except:
-        pass  # Mock integration
+        return False  # Mock integration
+
+def export_jira_hours(hours: List[Tuple[int, float]], day: date, progress: dict) -> dict:
+    """Posts every user's hours with up to JIRA_CONCURRENCY requests in flight, one batch at a time."""
+    try:
+        with requests.Session() as session, ThreadPoolExecutor(JIRA_CONCURRENCY) as pool:
+            session.mount(JIRA_API_URL, HTTPAdapter(pool_connections=1, pool_maxsize=JIRA_CONCURRENCY))
+            for i in range(0, len(hours), JIRA_BATCH_SIZE):
+                batch = hours[i:i + JIRA_BATCH_SIZE]
+                logged = sum(pool.map(lambda row: log_task_hours(row[0], row[1], day, session), batch))
+                progress["logged"] += logged
+                progress["failed"] += len(batch) - logged
+        progress["status"] = "done"
+    except Exception as exc:
+        progress["status"] = "failed"
+        progress["error"] = str(exc)[:500]
+    return progress
+
+def start_jira_export(hours: List[Tuple[int, float]], day: date, progress: dict):
+    # Thousands of users take far longer than a request should, so the export runs in the background
+    threading.Thread(target=export_jira_hours, args=(hours, day, progress), daemon=True).start()
+
+# GraphQL cache invalidation
+pending_invalidations = set()
+
+def post_invalidation(types: List[str], user_ids: List[int]):
+    try:
+        with external_call("graphql"):
+            requests.post(f"{GRAPHQL_URL}/cache/invalidate", json={"types": types, "user_ids": user_ids}, headers={"X-Invalidation-Token": CACHE_INVALIDATION_TOKEN}, timeout=0.5)
+    except:
+        pass  # Entries expire by TTL anyway
+
+def invalidate_graphql_cache(types: List[str], user_ids: List[int]):
+    # Fire and forget on a worker thread, so a slow or unreachable gateway never stalls the event loop
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(post_invalidation, types, user_ids))
+    pending_invalidations.add(task)
+    task.add_done_callback(pending_invalidations.discard)
+
+# Live feed
+LIVE_RETRY_SECONDS = float(os.getenv("LIVE_RETRY_SECONDS", "5"))
+live_redis = None
+live_redis_retry_at = 0.0
+pending_live_events = set()
+
+async def send_live_event(channel: str, message: str):
+    global live_redis, live_redis_retry_at
+    try:
+        if live_redis is None:
+            live_redis = aioredis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        await live_redis.publish(channel, message)
+    except:
+        live_redis_retry_at = time.monotonic() + LIVE_RETRY_SECONDS  # Dashboards resync on reconnect
+
+async def close_live_redis():
+    global live_redis
+    if live_redis is not None:
+        await live_redis.close()
+        live_redis = None
+
+def publish_live_event(topic: str, op: str, data: dict):
+    # Fire and forget on the asyncio client; while Redis is unreachable, skip instead of reconnecting on every write
+    if time.monotonic() < live_redis_retry_at:
+        return
+    task = asyncio.get_running_loop().create_task(send_live_event(f"live:{topic}", json.dumps({"op": op, "data": data}, default=str)))
+    pending_live_events.add(task)
+    task.add_done_callback(pending_live_events.discard)
 
 # Fraud Detection
 def detect_fraud(attendances: List[dict]) -> bool:
@@ -179,6 +386,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     access_token = jwt.encode({"sub": str(user.id)}, SECRET_KEY, algorithm=ALGORITHM)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/live/token")
+async def create_live_token(current_user: User = Depends(get_current_user)):
+    # Short-lived, since EventSource clients have to put it in the URL
+    if not LIVE_TOKEN_SECRET:
+        raise HTTPException(status_code=503, detail="Live feed is not configured")
+    expires = datetime.utcnow() + timedelta(seconds=LIVE_TOKEN_TTL)
+    token = jwt.encode({"sub": str(current_user.id), "role": current_user.role, "aud": "live", "exp": expires}, LIVE_TOKEN_SECRET, algorithm=ALGORITHM)
+    return {"token": token, "expires_in": LIVE_TOKEN_TTL}
+
 @app.post("/users/", response_model=UserCreate)
 async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     hashed_password = pwd_context.hash(user.password)
@@ -190,21 +406,21 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.post("/attendance/")
 async def record_attendance(record: AttendanceRecord, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    shift = db.query(Shift).filter(Shift.user_id == record.user_id, Shift.start_time <= datetime.utcnow(), Shift.end_time >= datetime.utcnow()).first()
-    penalty, reward = calculate_penalties_rewards(Attendance(**record.dict()), shift)
-    db_attendance = Attendance(user_id=record.user_id, is_entry=record.is_entry, penalty=penalty, reward=reward)
+    now = datetime.utcnow()
+    shift = db.query(Shift).filter(Shift.user_id == record.user_id, Shift.start_time <= now, Shift.end_time >= now).first()
+    penalty, reward = calculate_penalties_rewards(Attendance(timestamp=now, **record.dict()), shift)
+    db_attendance = Attendance(user_id=record.user_id, timestamp=now, is_entry=record.is_entry, penalty=penalty, reward=reward)
     db.add(db_attendance)
     db.commit()
+    invalidate_graphql_cache(["Attendance"], [record.user_id])
+    publish_live_event("attendance", "insert", {"id": db_attendance.id, "user_id": db_attendance.user_id, "timestamp": db_attendance.timestamp, "is_entry": db_attendance.is_entry, "penalty": penalty, "reward": reward})
     # Fraud detection
     recent_attendances = db.query(Attendance).filter(Attendance.user_id == record.user_id).order_by(Attendance.timestamp.desc()).limit(10).all()
     if detect_fraud([{"timestamp": a.timestamp} for a in recent_attendances]):
-        await telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=f"Fraud detected for user {record.user_id}")
+        notify_telegram(f"Fraud detected for user {record.user_id}")
     # Notify user
     user = db.query(User).filter(User.id == record.user_id).first()
-    await telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=f"Attendance recorded for {user.name}: {'Entry' if record.is_entry else 'Exit'}")
-    # Log to Jira
-    hours = 8.0 if not shift or shift.is_remote else 8.0  # Simplified
-    log_task_hours(record.user_id, hours)
+    notify_telegram(f"Attendance recorded for {user.name}: {'Entry' if record.is_entry else 'Exit'}")
     return {"status": "recorded", "penalty": penalty, "reward": reward}
 
 @app.post("/verify-face/")
@@ -212,6 +428,7 @@ async def verify_face_endpoint(user_id: int, file: UploadFile = File(...), db: S
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    import cv2
     image_data = await file.read()
     nparr = np.frombuffer(image_data, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
@@ -244,9 +461,16 @@ async def request_leave(leave: LeaveRequest, db: Session = Depends(get_db), curr
     db.add(db_leave)
     db.commit()
     # Suggest substitute
-    substitute = db.query(User).filter(User.id != leave.user_id, User.role != "hr").first()
-    await telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=f"Leave requested by user {leave.user_id}. Suggested substitute: {substitute.name}")
-    return {"status": "requested"}
+    # A stale or out-of-horizon index is rebuilt from the database; keep that off the event loop
+    index = await run_in_threadpool(availability_index.get, db, leave.start_date, leave.end_date)
+    candidates = index.find_substitutes(leave.user_id, leave.start_date, leave.end_date)
+    overlaps = index.team_overlaps(leave.user_id, leave.start_date, leave.end_date)
+    substitute = db.query(User).filter(User.id == candidates[0][0]).first() if candidates else None
+    message = f"Leave requested by user {leave.user_id}. Suggested substitute: {substitute.name if substitute else 'none available'}"
+    if overlaps:
+        message += f". Overlaps with approved leave of users {', '.join(map(str, overlaps))}"
+    notify_telegram(message)
+    return {"status": "requested", "suggested_substitutes": [user_id for user_id, _ in candidates], "team_overlaps": overlaps}
 
 @app.post("/leaves/approve/")
 async def approve_leave(leave_id: int, role: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -262,7 +486,9 @@ async def approve_leave(leave_id: int, role: str, db: Session = Depends(get_db),
     if leave.manager_approval and leave.hr_approval:
         leave.status = "approved"
     db.commit()
-    await telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=f"Leave {leave_id} {leave.status} by {role}")
+    if leave.status == "approved":
+        availability_index.record("leave", leave.user_id, leave.start_date, leave.end_date)
+    notify_telegram(f"Leave {leave_id} {leave.status} by {role}")
     return {"status": leave.status}
 
 @app.post("/shifts/")
@@ -270,6 +496,7 @@ async def create_shift(shift: ShiftCreate, db: Session = Depends(get_db), curren
     db_shift = Shift(**shift.dict())
     db.add(db_shift)
     db.commit()
+    availability_index.record("shift", shift.user_id, shift.start_time, shift.end_time)
     return {"status": "created"}
 
 @app.post("/shifts/emergency/")
@@ -278,39 +505,193 @@ async def emergency_shift(user_id: int, db: Session = Depends(get_db), current_u
     if shift:
         shift.end_time = datetime.utcnow() + timedelta(hours=1)  # Adjust shift
         db.commit()
+        availability_index.invalidate()
     return {"status": "adjusted"}
 
-@app.get("/attendances/")
-async def get_attendances(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(Attendance).all()
+@app.get("/availability/")
+def get_availability(start: datetime, end: datetime, role: Optional[str] = None, limit: int = 20, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    index = availability_index.get(db, start, end)
+    free = index.free_users(start, end, role=role, limit=limit)
+    return {"available": [{"user_id": user_id, "workload_hours": slots * SLOT_MINUTES / 60} for user_id, slots in free]}
 
+@app.get("/attendances/")
+async def get_attendances(user_id: Optional[List[int]] = Query(None), skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    q = db.query(Attendance)
+    if user_id:
+        q = q.filter(Attendance.user_id.in_(user_id))
+    q = q.order_by(Attendance.id).offset(skip)
+    if limit is not None:
+        q = q.limit(limit)
+    return q.all()
+
+# Archive scans: plain def so FastAPI runs these in its threadpool instead of on the event loop
 @app.get("/reports/attendance/pdf")
-async def generate_attendance_report(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def generate_attendance_report(start: Optional[datetime] = None, end: Optional[datetime] = None, user_id: Optional[List[int]] = Query(None), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
     c.drawString(100, 750, "Attendance Report")
-    attendances = db.query(Attendance).all()
+    attendances = archive.scan(db, ATTENDANCE_ARCHIVE, start, end, user_id)
     y = 700
-    for a in attendances:
+    for a in attendances.itertuples():
         c.drawString(100, y, f"User {a.user_id}: {'Entry' if a.is_entry else 'Exit'} at {a.timestamp}, Penalty: {a.penalty}, Reward: {a.reward}")
         y -= 20
     c.save()
-    buffer.seek(0)
-    return {"pdf": buffer.getvalue()}
+    return Response(buffer.getvalue(), media_type="application/pdf")
 
 @app.get("/reports/attendance/excel")
-async def generate_attendance_excel(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    attendances = db.query(Attendance).all()
-    df = pd.DataFrame([(a.user_id, a.is_entry, a.timestamp, a.penalty, a.reward) for a in attendances], columns=["User ID", "Is Entry", "Timestamp", "Penalty", "Reward"])
+def generate_attendance_excel(start: Optional[datetime] = None, end: Optional[datetime] = None, user_id: Optional[List[int]] = Query(None), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    attendances = archive.scan(db, ATTENDANCE_ARCHIVE, start, end, user_id, ["user_id", "is_entry", "timestamp", "penalty", "reward"])
+    df = attendances.drop(columns="archived")
+    df.columns = ["User ID", "Is Entry", "Timestamp", "Penalty", "Reward"]
     buffer = io.BytesIO()
     df.to_excel(buffer, index=False)
-    buffer.seek(0)
-    return {"excel": buffer.getvalue()}
+    return Response(buffer.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# Heavy pandas work: plain def so FastAPI runs these in its threadpool instead of on the event loop
+@app.post("/rollups/run")
+def run_rollups(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return rollups.run_incremental(db, Attendance.__table__, archived=ATTENDANCE_ARCHIVE)
+
+@app.post("/rollups/recompute")
+def recompute_rollups(month: date, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return rollups.recompute_month(db, Attendance.__table__, month, archived=ATTENDANCE_ARCHIVE)
+
+@app.get("/rollups/daily")
+async def get_daily_rollups(start: date, end: date, user_id: Optional[List[int]] = Query(None), skip: int = 0, limit: int = 1000, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        if user_id and user_id != [current_user.id]:
+            raise HTTPException(status_code=403, detail="Unauthorized")
+        user_id = [current_user.id]
+    q = db.query(AttendanceDaily).filter(AttendanceDaily.day >= start, AttendanceDaily.day <= end)
+    if user_id:
+        q = q.filter(AttendanceDaily.user_id.in_(user_id))
+    return q.order_by(AttendanceDaily.day, AttendanceDaily.user_id).offset(skip).limit(limit).all()
+
+@app.get("/rollups/monthly")
+async def get_monthly_rollups(month: date, user_id: Optional[List[int]] = Query(None), skip: int = 0, limit: int = 1000, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        if user_id and user_id != [current_user.id]:
+            raise HTTPException(status_code=403, detail="Unauthorized")
+        user_id = [current_user.id]
+    q = db.query(AttendanceMonthly).filter(AttendanceMonthly.month == rollups.month_start(month))
+    if user_id:
+        q = q.filter(AttendanceMonthly.user_id.in_(user_id))
+    return q.order_by(AttendanceMonthly.user_id).offset(skip).limit(limit).all()
+
+@app.post("/rollups/jira-export")
+async def export_rollup_hours(day: date, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if jira_exports.get(day, {}).get("status") == "running":
+        raise HTTPException(status_code=409, detail="Export already running for this day")
+    hours = rollups.hours_for_day(db, day)
+    # Marked running before the thread starts (nothing awaits since the check), so a second request is refused
+    jira_exports[day] = {"day": day, "status": "running", "users": len(hours), "logged": 0, "failed": 0}
+    start_jira_export(hours, day, jira_exports[day])
+    return {"day": day, "status": "started", "users": len(hours)}
+
+@app.get("/rollups/jira-export")
+async def get_rollup_export(day: date, current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if day not in jira_exports:
+        raise HTTPException(status_code=404, detail="No export for this day")
+    return jira_exports[day]
+
+@app.post("/archive/run")
+def run_archive(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return archive.run_archival(db, ATTENDANCE_ARCHIVE)
+
+@app.get("/archive/verify")
+def verify_archive(deep: bool = False, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return archive.verify(db, ATTENDANCE_ARCHIVE, deep)
+
+@app.get("/analytics/attendances")
+def attendance_analytics(start: datetime, end: datetime, user_id: Optional[List[int]] = Query(None), group_by: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(1000, ge=0), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        if user_id and user_id != [current_user.id]:
+            raise HTTPException(status_code=403, detail="Unauthorized")
+        user_id = [current_user.id]
+    if group_by not in (None, "user", "day", "month"):
+        raise HTTPException(status_code=400, detail="group_by must be user, day or month")
+    frame = archive.scan(db, ATTENDANCE_ARCHIVE, start, end, user_id)
+    if group_by:
+        frame = frame.groupby(archive.group_key(frame, ATTENDANCE_ARCHIVE, group_by)).agg(
+            punches=("id", "size"),
+            entries=("is_entry", "sum"),
+            penalty=("penalty", "sum"),
+            reward=("reward", "sum"),
+            archived=("archived", "sum"),
+        ).reset_index()
+    return {"total": len(frame), "rows": archive.records(frame.iloc[skip:skip + limit])}
+
+@app.post("/gdpr/erase/{user_id}")
+async def erase_user_data(user_id: int, mode: str = "delete", db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if mode not in ("delete", "anonymize"):
+        raise HTTPException(status_code=400, detail="mode must be delete or anonymize")
+    if not db.query(User).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    job = ErasureJob(user_id=user_id, mode=mode)
+    db.add(job)
+    db.commit()
+    gdpr.start_erasure(job.id, GDPR_TARGETS, erase_subject)
+    return gdpr.job_progress(job)
+
+@app.get("/gdpr/jobs/{job_id}")
+async def get_erasure_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    job = db.query(ErasureJob).filter(ErasureJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return gdpr.job_progress(job)
+
+@app.post("/gdpr/jobs/{job_id}/resume")
+async def resume_erasure_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    job = db.query(ErasureJob).filter(ErasureJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        job.status = "pending"
+        job.error = None
+        db.commit()
+    gdpr.start_erasure(job.id, GDPR_TARGETS, erase_subject)
+    return gdpr.job_progress(job)
+
+@app.get("/gdpr/export/{user_id}")
+async def export_user_data(user_id: int, format: str = "ndjson", current_user: User = Depends(get_current_user)):
+    if current_user.role != "hr" and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if format not in ("ndjson", "zip"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or zip")
+    sources = gdpr.export_sources(GDPR_TARGETS, user_id, lambda: export_subject(user_id))
+    media_type = "application/zip" if format == "zip" else "application/x-ndjson"
+    return StreamingResponse(
+        gdpr.stream_export(sources, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=user-{user_id}.{format}"},
+    )
 
 @app.get("/predict-leaves/")
 async def predict_leaves(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    import pandas as pd
     leaves = db.query(Leave).all()
     df = pd.DataFrame([(l.start_date, 1) for l in leaves], columns=["ds", "y"])
     df['ds'] = pd.to_datetime(df['ds'])
-    response = requests.post("http://ai-engine:8004/predict-demand/", json={"historical_data": df.to_dict(orient="records")})
+    with external_call("ai-engine"):
+        response = requests.post(f"{AI_ENGINE_URL}/predict-demand/", json={"historical_data": df.to_dict(orient="records")})
     return response.json()
\ No newline at end of file
@@ -0,0 +1,249 @@
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String, Table, UniqueConstraint, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import Base
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from archive import ArchivedTable
+
+MAX_SHIFT_HOURS = float(os.getenv("ROLLUP_MAX_SHIFT_HOURS", "16"))
+SETTLE_SECONDS = int(os.getenv("ROLLUP_SETTLE_SECONDS", "60"))
+NIGHTLY_AT = os.getenv("ROLLUP_NIGHTLY_AT", "02:00")  # UTC, HH:MM
+WRITE_CHUNK = 10000
+
+class AttendanceDaily(Base):
+    __tablename__ = "attendance_daily"
+    __table_args__ = (UniqueConstraint("user_id", "day"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    day = Column(Date, index=True)
+    month = Column(Date, index=True)
+    worked_minutes = Column(Float, default=0.0)
+    penalty = Column(Float, default=0.0)
+    reward = Column(Float, default=0.0)
+    late_count = Column(Integer, default=0)
+    punches = Column(Integer, default=0)
+    unmatched_punches = Column(Integer, default=0)
+
+class AttendanceMonthly(Base):
+    __tablename__ = "attendance_monthly"
+    __table_args__ = (UniqueConstraint("user_id", "month"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    month = Column(Date, index=True)
+    worked_hours = Column(Float, default=0.0)
+    penalty = Column(Float, default=0.0)
+    reward = Column(Float, default=0.0)
+    late_count = Column(Integer, default=0)
+    days_worked = Column(Integer, default=0)
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+DAILY_COLUMNS = ["user_id", "day", "month", "worked_minutes", "penalty", "reward", "late_count", "punches", "unmatched_punches"]
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def daily_rollup(punches: "pd.DataFrame") -> "pd.DataFrame":
+    """Pairs entry/exit punches and sums them per user per day in one vectorized pass.
+
+    ``punches`` needs user_id, timestamp, is_entry, penalty and reward. An entry pairs
+    with the user's next punch when that is an exit within MAX_SHIFT_HOURS. Worked time
+    counts on the entry's day, so night shifts are not split at midnight. An entry
+    that was penalized counts as late.
+    """
+    import pandas as pd
+    if punches.empty:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    df = punches.sort_values(["user_id", "timestamp"], kind="mergesort").reset_index(drop=True)
+    user = df["user_id"].to_numpy()
+    ts = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+    is_entry = df["is_entry"].to_numpy(dtype=bool)
+    same_user_next = np.zeros(len(df), dtype=bool)
+    same_user_next[:-1] = user[1:] == user[:-1]
+    next_exit = np.zeros(len(df), dtype=bool)
+    next_exit[:-1] = ~is_entry[1:]
+    gap = np.zeros(len(df), dtype="timedelta64[ns]")
+    gap[:-1] = ts[1:] - ts[:-1]
+    paired = is_entry & same_user_next & next_exit & (gap <= np.timedelta64(int(MAX_SHIFT_HOURS * 3600), "s"))
+    consumed = np.zeros(len(df), dtype=bool)
+    consumed[1:] = paired[:-1]
+    df["worked_minutes"] = np.where(paired, gap / np.timedelta64(1, "m"), 0.0)
+    df["late_count"] = (is_entry & (df["penalty"].to_numpy() > 0)).astype(np.int64)
+    df["unmatched_punches"] = (~(paired | consumed)).astype(np.int64)
+    df["punches"] = 1
+    df["day"] = df["timestamp"].dt.floor("D")
+    daily = df.groupby(["user_id", "day"], sort=False).agg(
+        worked_minutes=("worked_minutes", "sum"),
+        penalty=("penalty", "sum"),
+        reward=("reward", "sum"),
+        late_count=("late_count", "sum"),
+        punches=("punches", "sum"),
+        unmatched_punches=("unmatched_punches", "sum"),
+    ).reset_index()
+    daily["month"] = daily["day"].dt.to_period("M").dt.start_time.dt.date
+    daily["day"] = daily["day"].dt.date
+    return daily[DAILY_COLUMNS]
+
+def monthly_rollup(daily: "pd.DataFrame") -> "pd.DataFrame":
+    import pandas as pd
+    if daily.empty:
+        return pd.DataFrame(columns=["user_id", "month", "worked_hours", "penalty", "reward", "late_count", "days_worked"])
+    monthly = daily.assign(days_worked=(daily["worked_minutes"] > 0).astype(np.int64)).groupby(["user_id", "month"], sort=False).agg(
+        worked_minutes=("worked_minutes", "sum"),
+        penalty=("penalty", "sum"),
+        reward=("reward", "sum"),
+        late_count=("late_count", "sum"),
+        days_worked=("days_worked", "sum"),
+    ).reset_index()
+    monthly["worked_hours"] = monthly.pop("worked_minutes") / 60
+    return monthly
+
+def load_punches(db: Session, source: Table, start: datetime, end: datetime, user_ids: Optional[Iterable[int]] = None, archived: Optional["ArchivedTable"] = None) -> "pd.DataFrame":
+    """Punches in ``[start, end)``; with ``archived``, rows already moved to the cold archive are included."""
+    import pandas as pd
+    if archived is not None:
+        import archive
+        df = archive.scan(db, archived, start, end, list(user_ids) if user_ids is not None else None, ["user_id", "timestamp", "is_entry", "penalty", "reward"])
+        df = df[df["user_id"].notna()].drop(columns="archived").astype({"user_id": "int64"})
+        df[["penalty", "reward"]] = df[["penalty", "reward"]].fillna(0.0).astype(float)
+        return df.reset_index(drop=True)
+    query = select(source.c.user_id, source.c.timestamp, source.c.is_entry, source.c.penalty, source.c.reward).where(
+        source.c.timestamp >= start, source.c.timestamp < end, source.c.user_id.isnot(None)
+    )
+    if user_ids is not None:
+        query = query.where(source.c.user_id.in_(list(user_ids)))
+    rows = db.execute(query).all()
+    df = pd.DataFrame(rows, columns=["user_id", "timestamp", "is_entry", "penalty", "reward"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df[["penalty", "reward"]] = df[["penalty", "reward"]].fillna(0.0).astype(float)
+    return df
+
+def _records(df: "pd.DataFrame") -> List[Dict]:
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[column].tolist() for column in columns))]
+
+def _insert(db: Session, table: Table, df: "pd.DataFrame"):
+    records = _records(df)
+    for i in range(0, len(records), WRITE_CHUNK):
+        db.execute(insert(table), records[i:i + WRITE_CHUNK])
+
+def write_monthly(db: Session, user_ids: Optional[List[int]], months: List[date]):
+    """Rebuilds monthly rows for ``months`` (and ``user_ids`` if given) from the daily table."""
+    daily = AttendanceDaily.__table__
+    monthly = AttendanceMonthly.__table__
+    for month in months:
+        remove = delete(monthly).where(monthly.c.month == month)
+        source = select(
+            daily.c.user_id, daily.c.month,
+            (func.sum(daily.c.worked_minutes) / 60.0).label("worked_hours"),
+            func.sum(daily.c.penalty).label("penalty"),
+            func.sum(daily.c.reward).label("reward"),
+            func.sum(daily.c.late_count).label("late_count"),
+            func.count().filter(daily.c.worked_minutes > 0).label("days_worked"),
+        ).where(daily.c.month == month).group_by(daily.c.user_id, daily.c.month)
+        if user_ids is not None:
+            remove = remove.where(monthly.c.user_id.in_(user_ids))
+            source = source.where(daily.c.user_id.in_(user_ids))
+        db.execute(remove)
+        db.execute(insert(monthly).from_select(["user_id", "month", "worked_hours", "penalty", "reward", "late_count", "days_worked"], source))
+
+def recompute_month(db: Session, source: Table, month: date, archived: Optional["ArchivedTable"] = None) -> dict:
+    """Full rebuild of one month's daily and monthly rollups from the raw punches."""
+    started = time.perf_counter()
+    month = month_start(month)
+    end = next_month(month)
+    # One day of margin on each side so punches pairing across the month boundary are seen
+    punches = load_punches(db, source, datetime.combine(month, datetime.min.time()) - timedelta(days=1), datetime.combine(end, datetime.min.time()) + timedelta(days=1), archived=archived)
+    daily = daily_rollup(punches)
+    daily = daily[(daily["day"] >= month) & (daily["day"] < end)]
+    monthly = monthly_rollup(daily)
+    table = AttendanceDaily.__table__
+    db.execute(delete(table).where(table.c.month == month))
+    _insert(db, table, daily)
+    db.execute(delete(AttendanceMonthly.__table__).where(AttendanceMonthly.__table__.c.month == month))
+    _insert(db, AttendanceMonthly.__table__, monthly[["user_id", "month", "worked_hours", "penalty", "reward", "late_count", "days_worked"]])
+    db.commit()
+    return {"month": month.isoformat(), "punches": len(punches), "daily_rows": len(daily), "users": int(monthly["user_id"].nunique()) if len(monthly) else 0, "seconds": round(time.perf_counter() - started, 3)}
+
+def run_incremental(db: Session, source: Table, name: str = "attendance", archived: Optional["ArchivedTable"] = None) -> dict:
+    """Folds punches added since the watermark into the daily and monthly rollups.
+
+    Only the (user, day) ranges touched by new punches are recomputed, and the
+    watermark advances in the same transaction as the rollup rows. Punches younger
+    than SETTLE_SECONDS are left for the next run so concurrent inserts that commit
+    out of id order are not skipped.
+    """
+    started = time.perf_counter()
+    watermark = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    if watermark is None:
+        watermark = RollupWatermark(name=name, last_id=0)
+        db.add(watermark)
+    settled = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+    new = db.execute(select(source.c.id, source.c.user_id, source.c.timestamp).where(
+        source.c.id > watermark.last_id, source.c.timestamp < settled, source.c.user_id.isnot(None)
+    )).all()
+    if not new:
+        db.commit()
+        return {"new_punches": 0, "last_id": watermark.last_id, "seconds": round(time.perf_counter() - started, 3)}
+    user_ids = sorted({row.user_id for row in new})
+    # An exit can complete a pair whose entry was the previous day
+    first_day = min(row.timestamp for row in new).date() - timedelta(days=1)
+    last_day = max(row.timestamp for row in new).date()
+    punches = load_punches(
+        db, source,
+        datetime.combine(first_day, datetime.min.time()) - timedelta(days=1),
+        datetime.combine(last_day, datetime.min.time()) + timedelta(days=2),
+        user_ids,
+        archived,
+    )
+    daily = daily_rollup(punches)
+    daily = daily[(daily["day"] >= first_day) & (daily["day"] <= last_day)]
+    table = AttendanceDaily.__table__
+    for i in range(0, len(user_ids), WRITE_CHUNK):
+        db.execute(delete(table).where(table.c.user_id.in_(user_ids[i:i + WRITE_CHUNK]), table.c.day >= first_day, table.c.day <= last_day))
+    _insert(db, table, daily)
+    months = []
+    month = month_start(first_day)
+    while month <= last_day:
+        months.append(month)
+        month = next_month(month)
+    write_monthly(db, user_ids, months)
+    watermark.last_id = max(row.id for row in new)
+    watermark.updated_at = datetime.utcnow()
+    db.commit()
+    return {
+        "new_punches": len(new),
+        "users": len(user_ids),
+        "days": (last_day - first_day).days + 1,
+        "daily_rows": len(daily),
+        "last_id": watermark.last_id,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def seconds_until_nightly(at: Optional[str] = None, now: Optional[datetime] = None) -> float:
+    """Seconds from ``now`` (UTC) to the next ``HH:MM`` run time."""
+    now = now or datetime.utcnow()
+    hour, minute = map(int, (at or NIGHTLY_AT).split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    return (run - now).total_seconds()
+
+def hours_for_day(db: Session, day: date) -> List[Tuple[int, float]]:
+    rows = db.query(AttendanceDaily.user_id, AttendanceDaily.worked_minutes).filter(AttendanceDaily.day == day, AttendanceDaily.worked_minutes > 0).order_by(AttendanceDaily.user_id).all()
+    return [(user_id, round(minutes / 60, 2)) for user_id, minutes in rows]
@@ -0,0 +1,116 @@
+"""Archive two years of punches and time hot, cold and mixed queries.
+
+Runs against SQLite unless DATABASE_URL is set. Reports query timings before and
+after archival, Parquet bytes per row, manifest pruning and verify times.
+
+    python benchmarks/bench_archive.py --employees 1000 --months 24
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+def synthetic(employees: int, start: datetime, months: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, start + pd.DateOffset(months=months), freq="D", inclusive="left")
+    workdays = days[days.dayofweek < 5].to_numpy()
+    users = np.repeat(np.arange(1, employees + 1), len(workdays))
+    day = np.tile(workdays, employees)
+    entry = day + (rng.choice([6, 8, 9, 14], size=len(day)) * 60 + rng.integers(-10, 30, size=len(day))).astype("timedelta64[m]")
+    departure = entry + rng.integers(7 * 60, 9 * 60, size=len(day)).astype("timedelta64[m]")
+    late = rng.random(len(day)) < 0.08
+    entries = pd.DataFrame({"user_id": users, "timestamp": entry, "is_entry": True, "penalty": np.where(late, 10.0, 0.0), "reward": 0.0})
+    exits = pd.DataFrame({"user_id": users, "timestamp": departure, "is_entry": False, "penalty": 0.0, "reward": np.where(late, 0.0, 5.0)})
+    return pd.concat([entries, exits], ignore_index=True).sort_values("timestamp", kind="mergesort")
+
+def timed(fn, repeat: int = 3):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1), result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--horizon-days", type=int, default=90)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(workdir, "bench_archive.db"))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+    from sqlalchemy import Boolean, Column, DateTime, Float, Integer, func, insert, select
+    import archive
+    from database import Base, SessionLocal, engine
+
+    class Punch(Base):
+        __tablename__ = "bench_archive_punches"
+        id = Column(Integer, primary_key=True)
+        user_id = Column(Integer)
+        timestamp = Column(DateTime)
+        is_entry = Column(Boolean)
+        penalty = Column(Float)
+        reward = Column(Float)
+
+    Base.metadata.create_all(bind=engine)
+    now = datetime(2025, 6, 1)
+    punches = synthetic(args.employees, now - pd.DateOffset(months=args.months), args.months)
+    db = SessionLocal()
+    records = punches.assign(timestamp=punches["timestamp"].dt.to_pydatetime()).to_dict(orient="records")
+    for i in range(0, len(records), 50000):
+        db.execute(insert(Punch.__table__), records[i:i + 50000])
+    db.commit()
+
+    table = Punch.__table__
+    target = archive.ArchivedTable(table, horizon_days=args.horizon_days, root=os.path.join(workdir, "archive"))
+    user = args.employees // 2
+    year = (now - timedelta(days=365), now)
+    cold_month = (datetime(2024, 3, 1), datetime(2024, 4, 1))
+    recent = now - timedelta(days=1)
+    queries = {
+        "recent_day_all_users": lambda: db.execute(select(func.count()).select_from(table).where(table.c.timestamp >= recent)).scalar(),
+        "one_user_year": lambda: len(archive.scan(db, target, *year, [user])),
+        "all_users_cold_month": lambda: len(archive.scan(db, target, *cold_month)),
+    }
+    before = {name: timed(query)[0] for name, query in queries.items()}
+    before_rows = {name: query() for name, query in queries.items()}
+
+    started = time.perf_counter()
+    run = archive.run_archival(db, target, now=now)
+    archive_seconds = time.perf_counter() - started
+    after = {name: timed(query)[0] for name, query in queries.items()}
+    after_rows = {name: query() for name, query in queries.items()}
+    verify_ms, report = timed(lambda: archive.verify(db, target), repeat=1)
+    deep_ms, deep = timed(lambda: archive.verify(db, target, deep=True), repeat=1)
+    pruned = len(archive.segments_for(db, target, *cold_month))
+    db.close()
+
+    result = {
+        "employees": args.employees,
+        "rows": len(punches),
+        "rows_archived": run["rows_archived"],
+        "archive_rows_per_second": round(run["rows_archived"] / archive_seconds, 1),
+        "segments": report["segments"],
+        "segments_scanned_for_cold_month": pruned,
+        "parquet_bytes": report["bytes"],
+        "parquet_bytes_per_row": round(report["bytes"] / max(run["rows_archived"], 1), 2),
+        "same_results": before_rows == after_rows,
+        "query_ms_before": before,
+        "query_ms_after": after,
+        "verify_ms": verify_ms,
+        "verify_deep_ms": deep_ms,
+        "verified": report["ok"] and deep["ok"],
+    }
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
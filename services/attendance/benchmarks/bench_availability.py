@@ -0,0 +1,66 @@
+"""Build the staffing availability index for a synthetic workforce and time typical queries.
+
+    python benchmarks/bench_availability.py --employees 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from availability import HORIZON_DAYS, AvailabilityIndex
+
+def synthetic(employees: int, days: int, origin: datetime, seed: int = 7):
+    rng = random.Random(seed)
+    roles = ["employee"] * 8 + ["manager", "hr"]
+    users = [(i, rng.choice(roles)) for i in range(1, employees + 1)]
+    shifts, leaves = [], []
+    for user_id, _ in users:
+        start_hour = rng.choice([6, 8, 9, 14, 22])
+        for day in range(days):
+            if rng.random() < 0.7:
+                start = origin + timedelta(days=day, hours=start_hour)
+                shifts.append((user_id, start, start + timedelta(hours=8)))
+        if rng.random() < 0.1:
+            start = origin + timedelta(days=rng.randrange(days - 5))
+            leaves.append((user_id, start, start + timedelta(days=rng.randint(1, 5))))
+    return users, shifts, leaves
+
+def timed(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=HORIZON_DAYS)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    origin = datetime(2025, 4, 20)
+    users, shifts, leaves = synthetic(args.employees, args.days, origin)
+    build_ms, index = timed(lambda: AvailabilityIndex.build(origin, args.days, users, shifts, leaves), 1)
+    window = (origin + timedelta(days=10, hours=9), origin + timedelta(days=12, hours=17))
+    free_ms, free = timed(lambda: index.free_users(*window, role="employee", limit=20), args.repeat)
+    substitute_ms, _ = timed(lambda: index.find_substitutes(users[0][0], *window), args.repeat)
+    overlap_ms, _ = timed(lambda: index.team_overlaps(users[0][0], *window), args.repeat)
+    print(json.dumps({
+        "employees": args.employees,
+        "shifts": len(shifts),
+        "leaves": len(leaves),
+        "index_bytes": index.shifts.nbytes + index.leaves.nbytes,
+        "build_ms": round(build_ms, 1),
+        "free_users_ms": round(free_ms, 2),
+        "find_substitutes_ms": round(substitute_ms, 2),
+        "team_overlaps_ms": round(overlap_ms, 2),
+        "free_in_window": len(free),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Recompute a month of payroll rollups for a synthetic workforce.
+
+    python benchmarks/bench_rollups.py --employees 20000
+    python benchmarks/bench_rollups.py --employees 20000 --with-db   # includes the SQLite round trip
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+def synthetic(employees: int, month: datetime, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(month, periods=31 if month.month != 2 else 28, freq="D")
+    workdays = days[days.dayofweek < 5].to_numpy()
+    users = np.repeat(np.arange(1, employees + 1), len(workdays))
+    day = np.tile(workdays, employees)
+    start = day + (rng.choice([6, 8, 9, 14, 22], size=len(day)) * 60 + rng.integers(-10, 30, size=len(day))).astype("timedelta64[m]")
+    end = start + rng.integers(7 * 60, 9 * 60, size=len(day)).astype("timedelta64[m]")
+    late = rng.random(len(day)) < 0.08
+    entries = pd.DataFrame({"user_id": users, "timestamp": start, "is_entry": True, "penalty": np.where(late, 10.0, 0.0), "reward": 0.0})
+    exits = pd.DataFrame({"user_id": users, "timestamp": end, "is_entry": False, "penalty": 0.0, "reward": np.where(late, 0.0, 5.0)})
+    # Drop a few exits so the pairing has stragglers to flag
+    exits = exits[rng.random(len(exits)) > 0.01]
+    return pd.concat([entries, exits], ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=20000)
+    parser.add_argument("--with-db", action="store_true")
+    args = parser.parse_args()
+
+    if args.with_db:
+        os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_rollups.db"))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+    import rollups
+
+    month = datetime(2025, 4, 1)
+    punches = synthetic(args.employees, month)
+    started = time.perf_counter()
+    daily = rollups.daily_rollup(punches)
+    daily_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    monthly = rollups.monthly_rollup(daily)
+    monthly_ms = (time.perf_counter() - started) * 1000
+    result = {
+        "employees": args.employees,
+        "punches": len(punches),
+        "daily_rows": len(daily),
+        "monthly_rows": len(monthly),
+        "daily_rollup_ms": round(daily_ms, 1),
+        "monthly_rollup_ms": round(monthly_ms, 1),
+    }
+    if args.with_db:
+        from sqlalchemy import Boolean, Column, DateTime, Float, Integer, insert
+        from database import Base, SessionLocal, engine
+
+        class Punch(Base):
+            __tablename__ = "bench_punches"
+            id = Column(Integer, primary_key=True)
+            user_id = Column(Integer, index=True)
+            timestamp = Column(DateTime, index=True)
+            is_entry = Column(Boolean)
+            penalty = Column(Float)
+            reward = Column(Float)
+
+        Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        records = punches.assign(timestamp=punches["timestamp"].dt.to_pydatetime()).to_dict(orient="records")
+        db.execute(insert(Punch.__table__), records)
+        db.commit()
+        result["recompute_month"] = rollups.recompute_month(db, Punch.__table__, month.date())
+        db.close()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "archive.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, delete, func
+
+import archive
+import rollups
+from archive import ArchivedTable, ArchiveSegment
+from database import Base, SessionLocal, engine
+
+class Punch(Base):
+    __tablename__ = "test_archive_punches"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    timestamp = Column(DateTime)
+    is_entry = Column(Boolean)
+    penalty = Column(Float, default=0.0)
+    reward = Column(Float, default=0.0)
+
+Base.metadata.create_all(bind=engine)
+NOW = datetime(2025, 6, 1)
+
+def fresh(horizon_days=90):
+    db = SessionLocal()
+    db.execute(delete(Punch.__table__))
+    db.query(ArchiveSegment).delete()
+    db.commit()
+    db.close()
+    return ArchivedTable(Punch.__table__, horizon_days=horizon_days, root=tempfile.mkdtemp())
+
+def seed(days=200, users=5):
+    db = SessionLocal()
+    start = NOW - timedelta(days=days)
+    db.add_all([
+        Punch(user_id=user, timestamp=start + timedelta(days=day, hours=9 + user), is_entry=day % 2 == 0, penalty=float(user))
+        for day in range(days) for user in range(1, users + 1)
+    ])
+    db.commit()
+    db.close()
+
+def everything(db, target, **filters):
+    return archive.scan(db, target, **filters).drop(columns="archived")
+
+def test_archival_moves_old_rows_incrementally():
+    target = fresh()
+    seed()
+    db = SessionLocal()
+    before = everything(db, target)
+    result = archive.run_archival(db, target, now=NOW, batch_size=137)
+    assert result["rows_archived"] == 110 * 5 and result["batches"] == 5
+    hot = db.query(func.min(Punch.timestamp)).scalar()
+    assert hot >= NOW - timedelta(days=90)
+    again = archive.run_archival(db, target, now=NOW)
+    assert again["rows_archived"] == 0
+    after = everything(db, target)
+    assert after.equals(before)
+    segments = db.query(ArchiveSegment).all()
+    assert {segment.month.isoformat()[:7] for segment in segments} == {"2024-11", "2024-12", "2025-01", "2025-02", "2025-03"}
+    report = archive.verify(db, target, deep=True)
+    assert report["ok"] and report["archived_rows"] == 550 and report["hot_rows"] == 450
+    db.close()
+
+def test_scan_filters_hot_and_cold():
+    target = fresh()
+    seed()
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    start, end = NOW - timedelta(days=120), NOW - timedelta(days=60)
+    frame = archive.scan(db, target, start=start, end=end, user_ids=[2, 4])
+    assert set(frame["user_id"]) == {2, 4}
+    assert frame["timestamp"].min() >= start and frame["timestamp"].max() < end
+    assert len(frame) == 2 * 60 and frame["archived"].sum() == 2 * 30
+    assert frame["id"].is_monotonic_increasing
+    assert len(archive.segments_for(db, target, start=NOW - timedelta(days=10))) == 0
+    db.close()
+
+def test_scan_accepts_timezone_aware_bounds():
+    target = fresh()
+    seed()
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    start, end = NOW - timedelta(days=120), NOW - timedelta(days=60)
+    plus_two = timezone(timedelta(hours=2))
+    aware = archive.scan(db, target, start.replace(tzinfo=timezone.utc), (end + timedelta(hours=2)).replace(tzinfo=plus_two), [2])
+    assert aware.equals(archive.scan(db, target, start, end, [2]))
+    assert aware["archived"].sum() == 30
+    assert len(archive.segments_for(db, target, start.replace(tzinfo=timezone.utc))) == len(archive.segments_for(db, target, start))
+    db.close()
+
+def test_rollups_read_through_archive():
+    target = fresh()
+    seed(days=120, users=2)
+    db = SessionLocal()
+    before = rollups.recompute_month(db, Punch.__table__, date(2025, 2, 1))
+    archive.run_archival(db, target, now=NOW)
+    assert rollups.load_punches(db, Punch.__table__, datetime(2025, 2, 1), datetime(2025, 3, 1)).empty
+    after = rollups.recompute_month(db, Punch.__table__, date(2025, 2, 1), archived=target)
+    assert (after["punches"], after["daily_rows"]) == (before["punches"], before["daily_rows"]) == (58, 56)
+    db.close()
+
+def test_scan_deduplicates_rows_archived_mid_read():
+    target = fresh()
+    seed(days=100, users=1)
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    row = db.query(ArchiveSegment).first()
+    archived = archive.read_segment(target.path(row.path)).to_pylist()[0]
+    db.add(Punch(**archived))
+    db.commit()
+    frame = archive.scan(db, target, user_ids=[1])
+    assert len(frame) == 100 and frame["id"].is_unique
+    assert not frame.loc[frame["id"] == archived["id"], "archived"].item()
+    db.close()
+
+def test_verify_detects_tampering():
+    target = fresh()
+    seed(days=120, users=2)
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    segment = db.query(ArchiveSegment).order_by(ArchiveSegment.id).first()
+    with open(target.path(segment.path), "r+b") as f:
+        f.seek(-20, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    report = archive.verify(db, target)
+    assert not report["ok"] and report["problems"] == [{"segment": segment.path, "problem": "file checksum mismatch"}]
+    db.close()
+
+def test_batch_moved_concurrently_rolls_back(monkeypatch):
+    target = fresh()
+    seed(days=120, users=2)
+    write_segment = archive.write_segment
+    raced = []
+
+    def racing_write(target, data):
+        if raced:
+            return write_segment(target, data)
+        # Another archiver moves one of the selected rows first
+        raced.append(True)
+        other = SessionLocal()
+        other.execute(delete(Punch.__table__).where(Punch.id == data.column("id")[0].as_py()))
+        other.commit()
+        other.close()
+        return write_segment(target, data)
+
+    monkeypatch.setattr(archive, "write_segment", racing_write)
+    db = SessionLocal()
+    try:
+        archive.run_archival(db, target, now=NOW)
+        assert False, "expected the batch to fail"
+    except RuntimeError as exc:
+        assert "archived concurrently" in str(exc)
+    assert db.query(ArchiveSegment).count() == 0
+    assert db.query(Punch).count() == 239
+    assert [name for _, _, files in os.walk(target.root) for name in files] == []
+    db.close()
+
+def test_compaction_merges_small_segments():
+    target = fresh()
+    seed(days=120, users=3)
+    db = SessionLocal()
+    before = everything(db, target)
+    for day in range(30, 0, -3):
+        archive.archive_batch(db, target, NOW - timedelta(days=90 + day))
+    assert db.query(ArchiveSegment).filter(ArchiveSegment.month == datetime(2025, 2, 1).date()).count() >= 8
+    merged = archive.compact(db, target)
+    assert merged >= 8
+    assert db.query(ArchiveSegment).filter(ArchiveSegment.month == datetime(2025, 2, 1).date()).count() == 1
+    assert everything(db, target).equals(before)
+    assert archive.verify(db, target, deep=True)["ok"]
+    assert archive.remove_orphans(db, target, grace_seconds=0) == merged
+    assert archive.verify(db, target)["ok"]
+    db.close()
+
+def test_erasure_rewrites_segments():
+    target = fresh()
+    seed(days=120, users=3)
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    exported = [json.loads(line) for line in archive.export_rows(target, 2)]
+    assert len(exported) == 30 and {line["row"]["user_id"] for line in exported} == {2}
+    assert archive.erase_user(db, target, 2, "delete") == 30
+    assert archive.erase_user(db, target, 3, "anonymize") == 30
+    frame = archive.scan(db, target)
+    cold = frame[frame["archived"]]
+    assert 2 not in set(cold["user_id"]) and 3 not in set(cold["user_id"])
+    assert len(cold) == 60 and cold["user_id"].isna().sum() == 30
+    assert list(archive.export_rows(target, 2)) == []
+    assert archive.verify(db, target, deep=True)["ok"]
+    assert archive.remove_orphans(db, target, grace_seconds=0) == 0
+    db.close()
+
+def test_reports_are_returned_as_files(monkeypatch):
+    from types import SimpleNamespace
+
+    import pandas as pd
+    from fastapi.testclient import TestClient
+
+    import main
+
+    target = fresh()
+    seed(days=120, users=3)
+    db = SessionLocal()
+    archive.run_archival(db, target, now=NOW)
+    db.close()
+    monkeypatch.setattr(main, "ATTENDANCE_ARCHIVE", target)
+    main.app.dependency_overrides[main.get_current_user] = lambda: SimpleNamespace(id=1, role="hr")
+    try:
+        client = TestClient(main.app)
+        pdf = client.get("/reports/attendance/pdf", params={"user_id": 2})
+        excel = client.get("/reports/attendance/excel", params={"user_id": 2})
+    finally:
+        main.app.dependency_overrides.clear()
+    assert pdf.status_code == 200 and pdf.headers["content-type"] == "application/pdf"
+    assert pdf.content.startswith(b"%PDF")
+    assert excel.status_code == 200 and excel.headers["content-type"].startswith("application/vnd.openxmlformats-officedocument.spreadsheetml")
+    sheet = pd.read_excel(io.BytesIO(excel.content))
+    assert len(sheet) == 120 and set(sheet["User ID"]) == {2}
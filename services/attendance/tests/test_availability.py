@@ -0,0 +1,83 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from availability import AvailabilityIndex, IndexCache
+
+ORIGIN = datetime(2025, 4, 20)
+
+def at(day, hour):
+    return ORIGIN + timedelta(days=day, hours=hour)
+
+def build():
+    users = [(1, "employee"), (2, "employee"), (3, "employee"), (4, "hr"), (5, "manager")]
+    shifts = [
+        (2, at(1, 9), at(1, 17)),
+        (3, at(0, 9), at(0, 17)),
+        (3, at(2, 9), at(2, 17)),
+        (5, at(1, 9), at(1, 17)),
+    ]
+    leaves = [(3, at(1, 0), at(2, 0))]
+    return AvailabilityIndex.build(ORIGIN, 7, users, shifts, leaves)
+
+def test_free_users_exclude_shifts_leaves_and_hr():
+    index = build()
+    free = index.free_users(at(1, 10), at(1, 12))
+    assert [user_id for user_id, _ in free] == [1]
+
+def test_window_boundaries_are_half_open():
+    index = build()
+    assert 2 in [u for u, _ in index.free_users(at(1, 17), at(1, 19))]
+    assert 2 not in [u for u, _ in index.free_users(at(1, 16), at(1, 17))]
+
+def test_substitutes_share_role_and_are_ranked_by_workload():
+    index = build()
+    substitutes = index.find_substitutes(1, at(3, 9), at(3, 17))
+    assert [user_id for user_id, _ in substitutes] == [2, 3]
+    assert substitutes[0][1] < substitutes[1][1]
+
+def test_team_overlaps_and_incremental_updates():
+    index = build()
+    assert index.team_overlaps(1, at(1, 8), at(1, 9)) == [3]
+    assert index.team_overlaps(5, at(1, 8), at(1, 9)) == []
+    assert index.add_interval("leave", 2, at(1, 0), at(1, 12))
+    assert index.team_overlaps(1, at(1, 8), at(1, 9)) == [2, 3]
+    assert not index.add_interval("shift", 99, at(1, 0), at(1, 1))
+
+def test_cache_builds_one_off_index_outside_horizon():
+    calls = []
+
+    def loader(db, origin, days):
+        calls.append((origin, days))
+        return AvailabilityIndex.build(origin, days, [(1, "employee")], [], [])
+
+    cache = IndexCache(loader, horizon_days=30)
+    cache.get(None)
+    cache.get(None)
+    far = datetime.utcnow() + timedelta(days=200)
+    cache.get(None, far, far + timedelta(days=1))
+    assert len(calls) == 2
+    assert calls[1][0] <= far - timedelta(days=3)
+
+def test_substitutes_only_need_to_be_free_during_the_requesters_shifts():
+    users = [(1, "employee"), (2, "employee"), (3, "employee")]
+    shifts = [(user, at(day, start), at(day, start + 8)) for day in range(7) for user, start in ((1, 9), (2, 14), (3, 18))]
+    index = AvailabilityIndex.build(ORIGIN, 7, users, shifts, [])
+    # Everyone works during a week-long leave, but only user 3's evenings never overlap user 1's days
+    assert index.free_users(at(0, 0), at(7, 0)) == []
+    assert [user_id for user_id, _ in index.find_substitutes(1, at(0, 0), at(7, 0))] == [3]
+
+def test_timezone_aware_inputs_are_treated_as_utc():
+    index = build()
+    plus_two = timezone(timedelta(hours=2))
+    aware = index.free_users(at(1, 12).replace(tzinfo=plus_two), at(1, 14).replace(tzinfo=plus_two))
+    assert aware == index.free_users(at(1, 10), at(1, 12))
+    assert index.find_substitutes(1, at(3, 9).replace(tzinfo=timezone.utc), at(3, 17).replace(tzinfo=timezone.utc)) == index.find_substitutes(1, at(3, 9), at(3, 17))
+
+    cache = IndexCache(lambda db, origin, days: AvailabilityIndex.build(origin, days, [(1, "employee")], [], []))
+    now = datetime.now(timezone.utc)
+    assert cache.get(None, now, now + timedelta(days=1)).free_users(now, now + timedelta(hours=1)) == [(1, 0)]
+    far = now + timedelta(days=200)
+    assert cache.get(None, far, far + timedelta(days=1)).covers(far, far + timedelta(days=1))
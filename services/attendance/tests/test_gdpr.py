@@ -0,0 +1,174 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "gdpr.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from sqlalchemy import Column, Integer, String
+
+import gdpr
+from database import Base, SessionLocal, engine
+from gdpr import ErasureJob, Target
+
+class Punch(Base):
+    __tablename__ = "test_gdpr_punches"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    note = Column(String, nullable=True)
+
+class Badge(Base):
+    __tablename__ = "test_gdpr_badges"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+
+Base.metadata.create_all(bind=engine)
+
+TARGETS = [Target("punches", Punch, scrub={"note": None}), Target("badges", Badge)]
+subjects = []
+
+def erase_subject(db, user_id, mode):
+    subjects.append((user_id, mode))
+
+def seed(user_id, punches=25, badges=3):
+    db = SessionLocal()
+    db.add_all([Punch(user_id=user_id, note="x") for _ in range(punches)] + [Punch(user_id=user_id + 1000)])
+    db.add_all([Badge(user_id=user_id) for _ in range(badges)])
+    db.commit()
+    db.close()
+
+def count(model, **filters):
+    db = SessionLocal()
+    try:
+        return db.query(model).filter_by(**filters).count()
+    finally:
+        db.close()
+
+def new_job(user_id, mode, **fields):
+    db = SessionLocal()
+    job = ErasureJob(user_id=user_id, mode=mode, **fields)
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+def finished(job_id):
+    db = SessionLocal()
+    try:
+        return gdpr.job_progress(db.query(ErasureJob).filter(ErasureJob.id == job_id).first())
+    finally:
+        db.close()
+
+def test_erasure_runs_in_batches_and_leaves_other_users(monkeypatch):
+    monkeypatch.setattr(gdpr, "REMOTE_SERVICES", {})
+    monkeypatch.setattr(gdpr, "BATCH_SIZE", 10)
+    seed(1)
+    job_id = new_job(1, "delete")
+    gdpr.run_erasure(job_id, TARGETS, erase_subject)
+    progress = finished(job_id)
+    assert progress["status"] == "done"
+    assert progress["rows_done"] == 25 + 3 + 1
+    assert count(Punch, user_id=1) == 0 and count(Badge, user_id=1) == 0
+    assert count(Punch, user_id=1001) == 1
+    assert (1, "delete") in subjects
+
+def test_anonymize_clears_user_column_and_scrubs(monkeypatch):
+    monkeypatch.setattr(gdpr, "REMOTE_SERVICES", {})
+    seed(2, punches=4, badges=0)
+    gdpr.run_erasure(new_job(2, "anonymize"), TARGETS, erase_subject)
+    assert count(Punch, user_id=2) == 0
+    assert count(Punch, user_id=None, note=None) >= 4
+
+def test_stalled_job_resumes_from_checkpointed_step(monkeypatch):
+    monkeypatch.setattr(gdpr, "REMOTE_SERVICES", {})
+    seed(3, punches=5, badges=2)
+    stale = datetime.utcnow() - timedelta(seconds=gdpr.LEASE_SECONDS + 5)
+    job_id = new_job(3, "delete", status="running", step="badges", heartbeat_at=stale, rows_done=7)
+    gdpr.run_erasure(job_id, TARGETS, erase_subject)
+    assert finished(job_id)["status"] == "done"
+    assert count(Badge, user_id=3) == 0
+    assert count(Punch, user_id=3) == 5  # before the checkpoint, so not revisited
+
+def test_live_job_is_not_claimed_twice():
+    job_id = new_job(4, "delete", status="running", heartbeat_at=datetime.utcnow())
+    db = SessionLocal()
+    try:
+        assert gdpr.claim_job(db, job_id) is None
+    finally:
+        db.close()
+
+def test_zip_export_streams_entries_and_manifest():
+    sources = {
+        "attendance": lambda: (json.dumps({"table": "punches", "row": {"id": i}}).encode() + b"\n" for i in range(500)),
+        "catering": lambda: iter([]),
+    }
+    chunks = list(gdpr.stream_export(sources, "zip"))
+    assert len(chunks) > 1
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert len(archive.read("attendance.ndjson").splitlines()) == 500
+    assert json.loads(archive.read("manifest.json"))["rows"] == {"attendance": 500, "catering": 0}
+
+def test_ndjson_export_ends_with_summary(monkeypatch):
+    seed(5, punches=3, badges=1)
+    lines = list(gdpr.stream_export({"attendance": lambda: gdpr.export_rows(TARGETS, 5)}))
+    assert [json.loads(line)["table"] for line in lines[:-1]] == ["punches"] * 3 + ["badges"]
+    assert json.loads(lines[-1])["summary"]["rows"] == {"attendance": 4}
+
+def test_remote_calls_send_the_service_token(monkeypatch):
+    sent = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"processed": 0, "done": True}
+
+        def iter_lines(self):
+            return iter([b'{"table": "reservations"}'])
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    def record(url, headers=None, **kwargs):
+        sent.append(headers)
+        return Response()
+
+    monkeypatch.setattr(gdpr, "SERVICE_TOKEN", "s3cret")
+    monkeypatch.setattr(gdpr.requests, "post", record)
+    monkeypatch.setattr(gdpr.requests, "get", record)
+    assert gdpr.erase_remote("catering", 5, "delete")["done"]
+    assert list(gdpr.remote_export("catering", 5)) == [b'{"table": "reservations"}\n']
+    assert sent == [{"X-Service-Token": "s3cret"}] * 2
+
+def test_gdpr_endpoints_require_hr():
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+
+    import main
+
+    db = SessionLocal()
+    job = ErasureJob(user_id=5, mode="delete", status="done")
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    client = TestClient(main.app)
+    try:
+        main.app.dependency_overrides[main.get_current_user] = lambda: SimpleNamespace(id=7, role="employee")
+        assert client.get(f"/gdpr/jobs/{job_id}").status_code == 403
+        assert client.post("/gdpr/erase/5").status_code == 403
+        assert client.get("/gdpr/export/5").status_code == 403
+        main.app.dependency_overrides[main.get_current_user] = lambda: SimpleNamespace(id=1, role="hr")
+        assert client.get(f"/gdpr/jobs/{job_id}").json()["user_id"] == 5
+    finally:
+        main.app.dependency_overrides.clear()
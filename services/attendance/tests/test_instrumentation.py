@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+import instrumentation
+from instrumentation import Sampler, external_call
+
+engine = create_engine("sqlite://")
+app = FastAPI()
+instrumentation.instrument(app, engine)
+
+@app.get("/items/{item_id}")
+async def read_item(item_id: int):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    return {"id": item_id}
+
+client = TestClient(app)
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels)
+
+def test_requests_are_labelled_by_route_template():
+    before = sample_value("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200") or 0
+    client.get("/items/1")
+    client.get("/items/2")
+    assert sample_value("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert sample_value("http_request_db_queries_sum", route="/items/{item_id}") >= 4
+    body = client.get("/metrics").text
+    assert 'db_queries_total{operation="SELECT"}' in body
+    assert "/items/1" not in body
+
+def test_external_call_records_outcome():
+    with external_call("jira"):
+        pass
+    with pytest.raises(ValueError):
+        with external_call("jira"):
+            raise ValueError
+    assert sample_value("external_call_duration_seconds_count", target="jira", outcome="ok") >= 1
+    assert sample_value("external_call_duration_seconds_count", target="jira", outcome="error") >= 1
+
+def test_profile_endpoint_requires_token():
+    assert client.get("/debug/profile?seconds=0.1").status_code == 403
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_sampler_captures_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        sampler = Sampler(interval=0.002)
+        sampler.run(0.2)
+    finally:
+        stop.set()
+        worker.join()
+    assert sampler.samples > 10
+    assert any(stack.startswith("busy;") and "busy_loop" in stack for stack in sampler.stacks)
+
+def test_loop_lag_reports_blocked_loop():
+    async def scenario():
+        monitor = asyncio.get_running_loop().create_task(instrumentation.monitor_loop_lag(0.01))
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        monitor.cancel()
+    asyncio.run(scenario())
+    assert sample_value("event_loop_lag_distribution_seconds_count") >= 1
+    assert sample_value("event_loop_lag_distribution_seconds_bucket", le="0.05") < sample_value("event_loop_lag_distribution_seconds_count")
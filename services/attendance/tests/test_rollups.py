@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "rollups.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pandas as pd
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer
+
+import rollups
+from database import Base, SessionLocal, engine
+from rollups import AttendanceDaily, AttendanceMonthly
+
+class Punch(Base):
+    __tablename__ = "test_rollup_punches"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    timestamp = Column(DateTime)
+    is_entry = Column(Boolean)
+    penalty = Column(Float, default=0.0)
+    reward = Column(Float, default=0.0)
+
+Base.metadata.create_all(bind=engine)
+SOURCE = Punch.__table__
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["user_id", "timestamp", "is_entry", "penalty", "reward"])
+
+def add(*punches):
+    db = SessionLocal()
+    db.add_all([Punch(user_id=u, timestamp=t, is_entry=e, penalty=p) for u, t, e, p in punches])
+    db.commit()
+    db.close()
+
+def test_daily_rollup_pairs_punches():
+    day = datetime(2024, 3, 4)
+    daily = rollups.daily_rollup(frame([
+        (1, day + timedelta(hours=9), True, 10.0, 0.0),
+        (1, day + timedelta(hours=17), False, 0.0, 5.0),
+        (2, day + timedelta(hours=8), True, 0.0, 0.0),
+        (2, day + timedelta(hours=8, minutes=1), True, 0.0, 0.0),
+        (2, day + timedelta(hours=12), False, 0.0, 0.0),
+        (3, day + timedelta(hours=22), True, 0.0, 0.0),
+        (3, day + timedelta(days=1, hours=6), False, 0.0, 0.0),
+    ])).set_index(["user_id", "day"])
+    first = daily.loc[(1, day.date())]
+    assert first.worked_minutes == 480 and first.late_count == 1 and first.penalty == 10 and first.reward == 5
+    second = daily.loc[(2, day.date())]
+    assert second.worked_minutes == 239 and second.unmatched_punches == 1
+    # Night shift counts on the entry day
+    assert daily.loc[(3, day.date())].worked_minutes == 480
+    assert daily.loc[(3, day.date() + timedelta(days=1))].worked_minutes == 0
+
+def test_daily_rollup_leaves_overlong_pairs_unmatched():
+    day = datetime(2024, 3, 4)
+    daily = rollups.daily_rollup(frame([
+        (1, day + timedelta(hours=8), True, 0.0, 0.0),
+        (1, day + timedelta(days=1, hours=9), False, 0.0, 0.0),
+    ]))
+    assert daily.worked_minutes.sum() == 0 and daily.unmatched_punches.sum() == 2
+
+def test_recompute_month_matches_incremental():
+    month = datetime(2024, 5, 1)
+    add(*[(u, month + timedelta(days=d, hours=9), True, 0.0) for u in (10, 11) for d in range(5)])
+    add(*[(u, month + timedelta(days=d, hours=17), False, 0.0) for u in (10, 11) for d in range(5)])
+    db = SessionLocal()
+    stats = rollups.run_incremental(db, SOURCE, name="test-recompute")
+    assert stats["new_punches"] == 20
+    incremental = {(r.user_id, r.day): r.worked_minutes for r in db.query(AttendanceDaily).filter(AttendanceDaily.user_id.in_([10, 11]))}
+    rollups.recompute_month(db, SOURCE, month.date())
+    recomputed = {(r.user_id, r.day): r.worked_minutes for r in db.query(AttendanceDaily).filter(AttendanceDaily.user_id.in_([10, 11]))}
+    assert incremental == recomputed and len(recomputed) == 10
+    monthly = db.query(AttendanceMonthly).filter(AttendanceMonthly.user_id == 10, AttendanceMonthly.month == month.date()).one()
+    assert monthly.worked_hours == 40 and monthly.days_worked == 5
+    db.close()
+
+def test_incremental_run_resumes_from_watermark():
+    day = datetime(2024, 7, 1)
+    add((20, day + timedelta(hours=22), True, 10.0))
+    db = SessionLocal()
+    rollups.run_incremental(db, SOURCE, name="test-watermark")
+    assert rollups.run_incremental(db, SOURCE, name="test-watermark")["new_punches"] == 0
+    # The exit lands after midnight and completes the previous day's pair
+    add((20, day + timedelta(days=1, hours=6), False, 0.0))
+    assert rollups.run_incremental(db, SOURCE, name="test-watermark")["new_punches"] == 1
+    row = db.query(AttendanceDaily).filter(AttendanceDaily.user_id == 20, AttendanceDaily.day == day.date()).one()
+    assert row.worked_minutes == 480 and row.late_count == 1 and row.unmatched_punches == 0
+    assert rollups.hours_for_day(db, day.date()) == [(20, 8.0)]
+    db.close()
+
+def test_nightly_run_is_scheduled_for_the_next_occurrence():
+    assert rollups.seconds_until_nightly("02:00", datetime(2025, 5, 1, 1, 30)) == 30 * 60
+    assert rollups.seconds_until_nightly("02:00", datetime(2025, 5, 1, 2, 0)) == 24 * 3600
+    assert rollups.seconds_until_nightly("02:00", datetime(2025, 5, 1, 23, 0)) == 3 * 3600
+
+def test_jira_export_is_claimed_before_its_thread_runs(monkeypatch):
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+
+    import main
+
+    started = []
+    monkeypatch.setattr(main.rollups, "hours_for_day", lambda db, day: [(1, 8.0), (2, 7.5)])
+    # The background thread never gets scheduled before the second request
+    monkeypatch.setattr(main, "start_jira_export", lambda hours, day, progress: started.append(progress))
+    monkeypatch.setattr(main, "jira_exports", {})
+    main.app.dependency_overrides[main.get_current_user] = lambda: SimpleNamespace(id=1, role="hr")
+    try:
+        client = TestClient(main.app)
+        assert client.post("/rollups/jira-export", params={"day": "2025-05-01"}).status_code == 200
+        assert client.post("/rollups/jira-export", params={"day": "2025-05-01"}).status_code == 409
+        assert len(started) == 1 and started[0]["status"] == "running"
+    finally:
+        main.app.dependency_overrides.clear()
+
+    def broken(*args):
+        raise RuntimeError("pool unavailable")
+
+    monkeypatch.setattr(main, "ThreadPoolExecutor", broken)
+    progress = main.export_jira_hours([(1, 8.0)], date(2025, 5, 1), started[0])
+    assert progress["status"] == "failed" and "pool unavailable" in progress["error"]
@@ -0,0 +1,69 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+
+BATCH_SIZE = int(os.getenv("GDPR_BATCH_SIZE", "1000"))
+
+class Target:
+    """A table holding personal data, found through ``user_column``.
+
+    ``action`` forces "delete" or "anonymize" regardless of the requested mode; anonymizing
+    clears ``user_column`` and applies ``scrub``.
+    """
+
+    def __init__(self, name: str, model, user_column: str = "user_id", action: Optional[str] = None, scrub: Optional[Dict] = None):
+        self.name = name
+        self.model = model
+        self.user_column = user_column
+        self.action = action
+        self.scrub = scrub or {}
+
+def row_dict(row) -> dict:
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+def erase_batch(db: Session, target: Target, user_id: int, mode: str, batch_size: Optional[int] = None) -> int:
+    batch_size = batch_size or BATCH_SIZE
+    model = target.model
+    column = getattr(model, target.user_column)
+    ids = [row[0] for row in db.query(model.id).filter(column == user_id).order_by(model.id).limit(batch_size)]
+    if not ids:
+        return 0
+    batch = db.query(model).filter(model.id.in_(ids))
+    if (target.action or mode) == "anonymize":
+        batch.update({target.user_column: None, **target.scrub}, synchronize_session=False)
+    else:
+        batch.delete(synchronize_session=False)
+    return len(ids)
+
+def erase_next_batch(db: Session, targets: List[Target], user_id: int, mode: str, batch_size: Optional[int] = None) -> dict:
+    """One bounded, committed batch from the first target that still has rows; safe to repeat after a crash."""
+    for target in targets:
+        processed = erase_batch(db, target, user_id, mode, batch_size)
+        if processed:
+            db.commit()
+            return {"table": target.name, "processed": processed, "done": False}
+    return {"table": None, "processed": 0, "done": True}
+
+def export_rows(targets: List[Target], user_id: int, batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """NDJSON lines for every row of the subject, read in keyset batches."""
+    batch_size = batch_size or BATCH_SIZE
+    db = SessionLocal()
+    try:
+        for target in targets:
+            model = target.model
+            column = getattr(model, target.user_column)
+            last_id = 0
+            while True:
+                rows = db.query(model).filter(column == user_id, model.id > last_id).order_by(model.id).limit(batch_size).all()
+                if not rows:
+                    break
+                for row in rows:
+                    yield (json.dumps({"table": target.name, "row": row_dict(row)}, default=str) + "\n").encode()
+                last_id = rows[-1].id
+                db.expunge_all()
+    finally:
+        db.close()
@@ -1,20 +1,35 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, Query, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from database import SessionLocal, engine, Base
-import qrcode
+import gdpr
+from gdpr import Target
+import instrumentation
+from instrumentation import external_call
+from redis import asyncio as aioredis
+import asyncio
+import base64
+import importlib
 import io
-from sklearn.ensemble import RandomForestClassifier
-import pandas as pd
-import numpy as np
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import json
+import os
+import requests
+import secrets
+import time
 
-app = FastAPI()
+GRAPHQL_URL = os.getenv("GRAPHQL_URL", "http://graphql:8000")
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN", "")
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")  # Shared by attendance, catering and access-control
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+# Heavy modules load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") == "1"
+HEAVY_MODULES = ["pandas", "sklearn.ensemble", "qrcode", "reportlab.pdfgen.canvas"]
 
 # Database Models
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
 from datetime import datetime
 
 class Menu(Base):
@@ -48,8 +63,6 @@ class WasteReport(Base):
     quantity_wasted = Column(Float)
     date = Column(DateTime, default=datetime.utcnow)
 
-Base.metadata.create_all(bind=engine)
-
 # Pydantic Models
 class MenuCreate(BaseModel):
     name: str
@@ -81,11 +94,18 @@ def get_db():
     finally:
         db.close()
 
+def require_service_token(x_service_token: Optional[str] = Header(None)):
+    # Called by the attendance service; nginx exposes these routes too, so they need the shared secret
+    if not SERVICE_TOKEN or not secrets.compare_digest(x_service_token or "", SERVICE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid service token")
+
 # AI Menu Recommendation
 def recommend_menu(user_id: int, db: Session) -> int:
     reservations = db.query(Reservation).filter(Reservation.user_id == user_id).all()
     if not reservations:
         return db.query(Menu).first().id
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
     data = [(r.menu_id, r.quantity) for r in reservations]
     df = pd.DataFrame(data, columns=["menu_id", "quantity"])
     X = df[["quantity"]]
@@ -94,6 +114,65 @@ def recommend_menu(user_id: int, db: Session) -> int:
     clf.fit(X, y)
     return clf.predict([[1]])[0]
 
+# GraphQL cache invalidation
+pending_invalidations = set()
+
+def post_invalidation(types: List[str], user_ids: List[int]):
+    try:
+        with external_call("graphql"):
+            requests.post(f"{GRAPHQL_URL}/cache/invalidate", json={"types": types, "user_ids": user_ids}, headers={"X-Invalidation-Token": CACHE_INVALIDATION_TOKEN}, timeout=0.5)
+    except:
+        pass  # Entries expire by TTL anyway
+
+def invalidate_graphql_cache(types: List[str], user_ids: List[int]):
+    # Fire and forget on a worker thread, so a slow or unreachable gateway never stalls the event loop
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(post_invalidation, types, user_ids))
+    pending_invalidations.add(task)
+    task.add_done_callback(pending_invalidations.discard)
+
+# Live feed
+LIVE_RETRY_SECONDS = float(os.getenv("LIVE_RETRY_SECONDS", "5"))
+live_redis = None
+live_redis_retry_at = 0.0
+pending_live_events = set()
+
+async def send_live_event(channel: str, message: str):
+    global live_redis, live_redis_retry_at
+    try:
+        if live_redis is None:
+            live_redis = aioredis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        await live_redis.publish(channel, message)
+    except:
+        live_redis_retry_at = time.monotonic() + LIVE_RETRY_SECONDS  # Dashboards resync on reconnect
+
+async def close_live_redis():
+    global live_redis
+    if live_redis is not None:
+        await live_redis.close()
+        live_redis = None
+
+def publish_live_event(topic: str, op: str, data: dict):
+    # Fire and forget on the asyncio client; while Redis is unreachable, skip instead of reconnecting on every write
+    if time.monotonic() < live_redis_retry_at:
+        return
+    task = asyncio.get_running_loop().create_task(send_live_event(f"live:{topic}", json.dumps({"op": op, "data": data}, default=str)))
+    pending_live_events.add(task)
+    task.add_done_callback(pending_live_events.discard)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Base.metadata.create_all(bind=engine)
+    if not LAZY_STARTUP:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+    loop_monitor = instrumentation.start_loop_monitor()
+    yield
+    loop_monitor.cancel()
+    await close_live_redis()
+
+app = FastAPI(lifespan=lifespan)
+instrumentation.instrument(app, engine)
+
 # Routes
 @app.post("/menus/")
 async def create_menu(menu: MenuCreate, db: Session = Depends(get_db)):
@@ -111,13 +190,16 @@ async def create_reservation(reservation: ReservationCreate, db: Session = Depen
     db_reservation = Reservation(**reservation.dict())
     db.add(db_reservation)
     db.commit()
+    invalidate_graphql_cache(["Reservation"], [reservation.user_id])
+    publish_live_event("catering", "insert", {"id": db_reservation.id, "user_id": db_reservation.user_id, "menu_id": db_reservation.menu_id, "quantity": db_reservation.quantity, "date": db_reservation.date})
+    import qrcode
     qr = qrcode.QRCode()
     qr.add_data(f"reservation:{db_reservation.id}")
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white")
     buffer = io.BytesIO()
     img.save(buffer, format="PNG")
-    return {"status": "reserved", "qr_code": buffer.getvalue()}
+    return {"status": "reserved", "qr_code": base64.b64encode(buffer.getvalue()).decode()}
 
 @app.post("/inventory/")
 async def update_inventory(inventory: InventoryUpdate, db: Session = Depends(get_db)):
@@ -137,8 +219,14 @@ async def report_waste(report: WasteReportCreate, db: Session = Depends(get_db))
     return {"status": "reported"}
 
 @app.get("/reservations/")
-async def get_reservations(db: Session = Depends(get_db)):
-    return db.query(Reservation).all()
+async def get_reservations(user_id: Optional[List[int]] = Query(None), skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db)):
+    q = db.query(Reservation)
+    if user_id:
+        q = q.filter(Reservation.user_id.in_(user_id))
+    q = q.order_by(Reservation.id).offset(skip)
+    if limit is not None:
+        q = q.limit(limit)
+    return q.all()
 
 @app.get("/recommend-menu/{user_id}")
 async def get_recommended_menu(user_id: int, db: Session = Depends(get_db)):
@@ -150,6 +238,9 @@ async def generate_token_pdf(reservation_id: int, db: Session = Depends(get_db))
     reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
     if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
+    import qrcode
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
     c.drawString(100, 750, f"Token for Reservation {reservation_id}")
@@ -161,8 +252,7 @@ async def generate_token_pdf(reservation_id: int, db: Session = Depends(get_db))
     img.save("token.png")
     c.drawImage("token.png", 100, 600, width=100, height=100)
     c.save()
-    buffer.seek(0)
-    return {"pdf": buffer.getvalue()}
+    return Response(buffer.getvalue(), media_type="application/pdf")
 # (Add to existing main.py)
 class Sustainability(Base):
     __tablename__ = "sustainability"
@@ -180,4 +270,24 @@ async def update_sustainability(update: SustainabilityUpdate, db: Session = Depe
     db_sustainability = Sustainability(user_id=update.user_id, used_recyclable=update.used_recyclable, reward_points=10 if update.used_recyclable else 0)
     db.add(db_sustainability)
     db.commit()
-    return {"status": "updated", "reward_points": db_sustainability.reward_points}
\ No newline at end of file
+    return {"status": "updated", "reward_points": db_sustainability.reward_points}
+
+GDPR_TARGETS = [
+    Target("reservations", Reservation),
+    Target("sustainability", Sustainability),
+]
+
+class ErasureRequest(BaseModel):
+    user_id: int
+    mode: str = "delete"
+    batch_size: int = gdpr.BATCH_SIZE
+
+@app.post("/gdpr/erase", dependencies=[Depends(require_service_token)])
+async def erase_user_data(request: ErasureRequest, db: Session = Depends(get_db)):
+    if request.mode not in ("delete", "anonymize"):
+        raise HTTPException(status_code=400, detail="mode must be delete or anonymize")
+    return gdpr.erase_next_batch(db, GDPR_TARGETS, request.user_id, request.mode, request.batch_size)
+
+@app.get("/gdpr/export/{user_id}", dependencies=[Depends(require_service_token)])
+async def export_user_data(user_id: int):
+    return StreamingResponse(gdpr.export_rows(GDPR_TARGETS, user_id), media_type="application/x-ndjson")
\ No newline at end of file
@@ -0,0 +1,27 @@
+import base64
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "catering.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fastapi.testclient import TestClient
+
+import main
+
+def test_reservation_qr_code_is_base64_png():
+    with TestClient(main.app) as client:
+        response = client.post("/reservations/", json={"user_id": 1, "menu_id": 1, "quantity": 1, "date": "2025-06-02T12:00:00", "is_guest": False})
+    assert response.status_code == 200 and response.json()["status"] == "reserved"
+    assert base64.b64decode(response.json()["qr_code"]).startswith(b"\x89PNG")
+
+def test_token_pdf_is_returned_as_a_file(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    with TestClient(main.app) as client:
+        client.post("/reservations/", json={"user_id": 2, "menu_id": 1, "quantity": 1, "date": "2025-06-02T12:00:00", "is_guest": False})
+        reservation_id = client.get("/reservations/", params={"user_id": 2}).json()[0]["id"]
+        response = client.get(f"/tokens/pdf/{reservation_id}")
+        assert client.get("/tokens/pdf/999999").status_code == 404
+    assert response.status_code == 200 and response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
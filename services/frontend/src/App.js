@@ -94,10 +94,51 @@ function App() {
   }, [i18n.language]);
 
   // Fetch data
-  useEffect(() => {
+  const fetchSnapshot = () => {
     axios.get('http://localhost/api/attendance/attendances').then(res => setAttendanceData(res.data)).catch(() => setAttendanceData([]));
     axios.get('http://localhost/api/catering/reservations').then(res => setReservationData(res.data)).catch(() => setReservationData([]));
     axios.get('http://localhost/api/access-control/access-logs').then(res => setAccessLogs(res.data)).catch(() => setAccessLogs([]));
+  };
+
+  // Live updates: one snapshot, then deltas pushed by the server
+  useEffect(() => {
+    fetchSnapshot();
+    const applyDelta = (setter) => (event) => {
+      const { data } = JSON.parse(event.data);
+      setter(prev => [...prev.filter(row => row.id !== data.id), data]);
+    };
+    let source = null;
+    let opened = false;
+    let stopped = false;
+    const connect = () => {
+      // EventSource cannot send an Authorization header, so the feed takes a short-lived token in the URL
+      axios.post('http://localhost/api/attendance/live/token').then(res => {
+        if (stopped) return;
+        source = new EventSource(`http://localhost/api/graphql/live/events?topics=attendance,catering,access&token=${encodeURIComponent(res.data.token)}`);
+        source.onopen = () => {
+          // Deltas sent while disconnected (or dropped as a slow consumer) are lost; resync
+          if (opened) fetchSnapshot();
+          opened = true;
+        };
+        source.onerror = () => {
+          // Reconnects reuse the URL, so once the token has expired mint a new one
+          if (source.readyState === EventSource.CLOSED && !stopped) setTimeout(connect, 3000);
+        };
+        source.addEventListener('attendance', applyDelta(setAttendanceData));
+        source.addEventListener('catering', applyDelta(setReservationData));
+        source.addEventListener('access', applyDelta(setAccessLogs));
+      }).catch(() => {
+        if (!stopped) setTimeout(connect, 3000);
+      });
+    };
+    connect();
+    return () => {
+      stopped = true;
+      if (source) source.close();
+    };
+  }, []);
+
+  useEffect(() => {
     // Fetch recommended menu
     if (userId) {
       axios.get(`http://localhost/api/catering/recommend-menu/${userId}`).then(res => setSelectedMenu(res.data.menu_id));
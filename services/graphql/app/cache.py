@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Iterable, List, Optional
+
+CACHE_BACKEND = os.getenv("GRAPHQL_CACHE_BACKEND", "memory")  # memory, redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+CACHE_MAX_ENTRIES = int(os.getenv("GRAPHQL_CACHE_MAX_ENTRIES", "10000"))
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN")
+
+# Seconds a cached field stays fresh per GraphQL type; 0 disables caching for the type
+DEFAULT_TTLS = {"Attendance": 5, "Reservation": 30, "AccessLog": 5, "TransparencyReport": 60}
+
+def parse_ttls(spec: str) -> Dict[str, int]:
+    """Parses ``"Attendance=5,Reservation=30"`` into a TTL map."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = int(seconds)
+    return ttls
+
+CACHE_TTLS = {**DEFAULT_TTLS, **parse_ttls(os.getenv("GRAPHQL_CACHE_TTLS", ""))}
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry; generation counters never expire."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_counters(self, names: List[str]) -> List[int]:
+        return [self._counters.get(name, 0) for name in names]
+
+    async def incr(self, names: Iterable[str]):
+        for name in names:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    async def close(self):
+        pass
+
+class RedisBackend:
+    """Shared backend so every gateway replica sees the same entries and invalidations."""
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "graphql:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Any:
+        raw = await self._redis.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self._redis.set(self.prefix + key, json.dumps(value, default=str), ex=ttl or None)
+
+    async def get_counters(self, names: List[str]) -> List[int]:
+        values = await self._redis.mget([self.prefix + "gen:" + name for name in names])
+        return [int(value or 0) for value in values]
+
+    async def incr(self, names: Iterable[str]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(self.prefix + "gen:" + name)
+            await pipe.execute()
+
+    async def close(self):
+        await self._redis.close()
+
+def create_backend():
+    if CACHE_BACKEND == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+class ResponseCache:
+    """Field-level response cache.
+
+    Entries are keyed on the field, its arguments, the caller's auth scope and the
+    current generation of every type the field depends on. Invalidating a type bumps
+    its generation, so stale entries are never read again and simply age out.
+    """
+
+    def __init__(self, backend, ttls: Optional[Dict[str, int]] = None):
+        self.backend = backend
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def generation_names(type_names: Iterable[str], user_id: Optional[int]) -> List[str]:
+        names = []
+        for type_name in type_names:
+            names.append(type_name)
+            names.append(f"{type_name}:user:{user_id}" if user_id is not None else f"{type_name}:lists")
+        return names
+
+    async def get_or_load(self, field: str, type_name: str, depends: Iterable[str], args: Dict, scope: Optional[str], loader):
+        ttl = self.ttls.get(type_name, 0)
+        if ttl <= 0:
+            return await loader()
+        generations = await self.backend.get_counters(self.generation_names(depends, args.get("userId")))
+        raw_key = json.dumps([field, scope, args, generations], sort_keys=True, default=str)
+        key = "field:" + hashlib.sha256(raw_key.encode()).hexdigest()
+        value = await self.backend.get(key)
+        if value is not None:
+            return value
+        # Identical misses in this worker wait on the first upstream fetch instead of repeating it
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+        try:
+            value = await future
+        finally:
+            self._inflight.pop(key, None)
+        await self.backend.set(key, value, ttl)
+        return value
+
+    async def invalidate(self, type_names: Iterable[str], user_ids: Optional[Iterable[int]] = None):
+        names = []
+        for type_name in type_names:
+            if user_ids:
+                names.extend(f"{type_name}:user:{user_id}" for user_id in user_ids)
+                names.append(f"{type_name}:lists")
+            else:
+                names.append(type_name)
+        await self.backend.incr(names)
+
+response_cache: Optional[ResponseCache] = None
+
+def get_cache() -> ResponseCache:
+    global response_cache
+    if response_cache is None:
+        response_cache = ResponseCache(create_backend())
+    return response_cache
+
+async def close_cache():
+    global response_cache
+    if response_cache is not None:
+        await response_cache.backend.close()
+        response_cache = None
+
+def auth_scope(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+def cached(type_name: str, depends: Optional[Iterable[str]] = None):
+    """Caches a resolver's result for ``CACHE_TTLS[type_name]`` seconds."""
+    depends = tuple(depends or (type_name,))
+
+    def decorator(resolver):
+        @wraps(resolver)
+        async def wrapper(obj, info, **args):
+            cache = info.context.get("cache")
+            if cache is None:
+                return await resolver(obj, info, **args)
+            return await cache.get_or_load(
+                info.field_name, type_name, depends, args, info.context.get("cache_scope"),
+                lambda: resolver(obj, info, **args),
+            )
+        return wrapper
+    return decorator
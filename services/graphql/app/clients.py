@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+
+import httpx
+
+ATTENDANCE_URL = os.getenv("ATTENDANCE_URL", "http://attendance:8000")
+CATERING_URL = os.getenv("CATERING_URL", "http://catering:8000")
+ACCESS_CONTROL_URL = os.getenv("ACCESS_CONTROL_URL", "http://access-control:8000")
+
+MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", "200"))
+MAX_KEEPALIVE = int(os.getenv("GATEWAY_MAX_KEEPALIVE", "50"))
+TIMEOUT = float(os.getenv("GATEWAY_TIMEOUT", "10"))
+
+http_client: Optional[httpx.AsyncClient] = None
+
+def create_client() -> httpx.AsyncClient:
+    # One pooled client per worker; connections to upstreams are kept alive between requests
+    return httpx.AsyncClient(
+        timeout=TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE, keepalive_expiry=30),
+    )
+
+def get_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        http_client = create_client()
+    return http_client
+
+async def close_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
@@ -0,0 +1,82 @@
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from ariadne.validation import cost_validator
+from graphql import FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, GraphQLInt, InlineFragmentNode
+from graphql.utilities import value_from_ast
+from graphql.validation import ValidationRule
+
+MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", "1000"))
+MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", "5"))
+DEFAULT_PAGE_SIZE = 100
+
+# List fields cost one unit per requested row, so a dashboard can't fetch past MAX_COST rows per query
+COST_MAP = {
+    "Query": {
+        "attendances": {"complexity": 1, "multipliers": ["limit"]},
+        "reservations": {"complexity": 1, "multipliers": ["limit"]},
+        "accessLogs": {"complexity": 1, "multipliers": ["limit"]},
+        "transparencyReport": {"complexity": 2},
+    },
+}
+
+PAGING_ARGUMENTS = ("offset", "limit")
+
+def paging_validator(variables: Optional[Dict]):
+    """Rejects negative offset/limit; a negative limit would also make the cost negative."""
+    class PagingValidator(ValidationRule):
+        def enter_argument(self, node, *_args):
+            if node.name.value not in PAGING_ARGUMENTS:
+                return
+            value = value_from_ast(node.value, GraphQLInt, variables)
+            if isinstance(value, int) and value < 0:
+                self.report_error(GraphQLError(f"{node.name.value} must be non-negative (got {value}).", node))
+
+    return PagingValidator
+
+def page(offset: Optional[int], limit: Optional[int]) -> Tuple[Optional[int], int]:
+    """Offset and limit as sent upstream, clamped to [0, MAX_COST] in case validation was skipped."""
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    return (max(offset, 0) if offset is not None else None), max(0, min(limit, MAX_COST))
+
+def depth_limit_validator(max_depth: int):
+    class DepthLimitValidator(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            fragments = {
+                definition.name.value: definition
+                for definition in self.context.document.definitions
+                if isinstance(definition, FragmentDefinitionNode)
+            }
+            depth = self.measure(node.selection_set, fragments, set())
+            if depth > max_depth:
+                self.report_error(GraphQLError(
+                    f"The query exceeds the maximum depth of {max_depth} (got {depth}).",
+                    node,
+                    extensions={"depth": {"requestedDepth": depth, "maximumAvailable": max_depth}},
+                ))
+
+        def measure(self, selection_set, fragments: Dict, visited: Set[str]) -> int:
+            if selection_set is None:
+                return 0
+            deepest = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    if name in visited or name not in fragments:
+                        continue
+                    depth = self.measure(fragments[name].selection_set, fragments, visited | {name})
+                elif isinstance(selection, InlineFragmentNode):
+                    depth = self.measure(selection.selection_set, fragments, visited)
+                else:
+                    depth = 1 + self.measure(selection.selection_set, fragments, visited)
+                deepest = max(deepest, depth)
+            return deepest
+
+    return DepthLimitValidator
+
+def validation_rules(context_value, document, data):
+    return [
+        paging_validator(data.get("variables")),
+        cost_validator(maximum_cost=MAX_COST, variables=data.get("variables"), cost_map=COST_MAP),
+        depth_limit_validator(MAX_DEPTH),
+    ]
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional, Set
+
+from jose import JWTError, jwt
+
+from cache import REDIS_URL
+
+LIVE_CHANNEL_PREFIX = "live:"
+LIVE_TOPICS = ("attendance", "access", "catering")
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "256"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "10000"))
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+LIVE_TOKEN_SECRET = os.getenv("LIVE_TOKEN_SECRET", "")
+LIVE_TOKEN_AUDIENCE = "live"
+
+logger = logging.getLogger(__name__)
+
+class Event:
+    """One delta as published by a service; the SSE frame is encoded once and shared by every subscriber."""
+
+    __slots__ = ("topic", "payload", "user_id", "frame")
+
+    def __init__(self, topic: str, data: str):
+        self.topic = topic
+        self.payload = json.loads(data)
+        self.user_id = (self.payload.get("data") or {}).get("user_id")
+        self.frame = f"event: {topic}\ndata: {data}\n\n".encode()
+
+CLOSED = object()
+
+class Subscriber:
+    def __init__(self, topics: Set[str], user_ids: Optional[Set[int]], buffer_size: int):
+        self.topics = topics
+        self.user_ids = user_ids
+        self.queue: asyncio.Queue = asyncio.Queue(buffer_size)
+        self.dropped = False
+
+    def wants(self, event: Event) -> bool:
+        return self.user_ids is None or event.user_id in self.user_ids
+
+class TooManySubscribers(Exception):
+    pass
+
+class UnknownTopics(ValueError):
+    pass
+
+class InvalidLiveToken(Exception):
+    pass
+
+class ForbiddenUsers(Exception):
+    pass
+
+def verify_token(token: Optional[str], secret: Optional[str] = None) -> dict:
+    """Checks a live token minted by the attendance service (``POST /live/token``).
+
+    Live tokens are short-lived HS256 JWTs with ``sub``, ``role``, ``aud`` and ``exp``
+    claims. EventSource and browser websockets cannot send an Authorization header,
+    so clients pass them as a query parameter or in ``connection_init``.
+    """
+    secret = LIVE_TOKEN_SECRET if secret is None else secret
+    if not secret or not token:
+        raise InvalidLiveToken("Live token required")
+    try:
+        claims = jwt.decode(token, secret, algorithms=["HS256"], audience=LIVE_TOKEN_AUDIENCE, options={"require_exp": True})
+        user_id = int(claims["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise InvalidLiveToken("Expired or invalid live token")
+    return {"user_id": user_id, "role": claims.get("role")}
+
+def authorize(token: Optional[str], user_ids: Optional[Iterable[int]] = None) -> Optional[Set[int]]:
+    """User filter for a new subscriber: HR may watch anyone, everybody else only themselves."""
+    claims = verify_token(token)
+    requested = set(user_ids) if user_ids else None
+    if claims["role"] == "hr":
+        return requested
+    if requested is not None and requested != {claims["user_id"]}:
+        raise ForbiddenUsers("Unauthorized")
+    return {claims["user_id"]}
+
+class Broker:
+    """Fans Redis pub/sub deltas out to local subscribers.
+
+    Every subscriber has a bounded buffer. A subscriber whose buffer fills up is
+    dropped rather than allowed to hold memory or slow down the others; clients
+    reconnect and refetch a snapshot.
+    """
+
+    def __init__(self, buffer_size: int = LIVE_BUFFER_SIZE, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Dict[str, Set[Subscriber]] = {topic: set() for topic in LIVE_TOPICS}
+        self.members: Set[Subscriber] = set()
+        self.dropped = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+    def subscribe(self, topics: Iterable[str], user_ids: Optional[Iterable[int]] = None) -> Subscriber:
+        topics = set(topics)
+        if not topics or not topics <= set(LIVE_TOPICS):
+            raise UnknownTopics(f"topics must be a non-empty subset of {', '.join(LIVE_TOPICS)}")
+        if self.count >= self.max_subscribers:
+            raise TooManySubscribers()
+        subscriber = Subscriber(topics, set(user_ids) if user_ids else None, self.buffer_size)
+        for topic in subscriber.topics:
+            self.subscribers[topic].add(subscriber)
+        self.members.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for topic in subscriber.topics:
+            self.subscribers[topic].discard(subscriber)
+        self.members.discard(subscriber)
+
+    def publish(self, event: Event):
+        for subscriber in tuple(self.subscribers.get(event.topic, ())):
+            if not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.drop(subscriber)
+
+    def drop(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber)
+        self.dropped += 1
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(CLOSED)
+
+    async def listen(self, url: str = REDIS_URL):
+        """Relays ``live:*`` channels into ``publish`` until cancelled, reconnecting on errors."""
+        import redis.asyncio as redis
+
+        delay = 1
+        while True:
+            client = redis.from_url(url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(LIVE_CHANNEL_PREFIX + "*")
+                    delay = 1
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        topic = message["channel"].decode()[len(LIVE_CHANNEL_PREFIX):]
+                        try:
+                            self.publish(Event(topic, message["data"].decode()))
+                        except ValueError:
+                            logger.warning("Dropping malformed live event on %s", topic)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Live feed connection lost (%s), retrying in %ss", exc, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                await client.close()
+
+async def stream(broker: Broker, subscriber: Subscriber, heartbeat: float = LIVE_HEARTBEAT):
+    """Server-sent events for one subscriber."""
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is CLOSED:
+                yield b"event: dropped\ndata: {}\n\n"
+                return
+            yield event.frame
+    finally:
+        broker.unsubscribe(subscriber)
+
+async def events(broker: Broker, subscriber: Subscriber):
+    """Event payloads for one subscriber, used by GraphQL subscriptions."""
+    try:
+        while True:
+            event = await subscriber.queue.get()
+            if event is CLOSED:
+                return
+            yield event
+    finally:
+        broker.unsubscribe(subscriber)
+
+broker = Broker()
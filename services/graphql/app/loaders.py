@@ -0,0 +1,92 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from clients import ATTENDANCE_URL, CATERING_URL, ACCESS_CONTROL_URL
+from instrumentation import external_call
+
+pending_batches = set()
+
+class DataLoader:
+    """Coalesces ``load`` calls made in the same loop tick into one batch call, memoized per request."""
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Awaitable[List[Any]]]):
+        self._batch_fn = batch_fn
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Tuple[Hashable, asyncio.Future]] = []
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        if key in self._cache:
+            return self._cache[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append((key, future))
+        if len(self._queue) == 1:
+            loop.call_soon(self._dispatch)
+        return future
+
+    def load_many(self, keys: List[Hashable]) -> Awaitable[List[Any]]:
+        return asyncio.gather(*(self.load(key) for key in keys))
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._run(queue))
+        pending_batches.add(task)
+        task.add_done_callback(pending_batches.discard)
+
+    async def _run(self, queue):
+        try:
+            values = await self._batch_fn([key for key, _ in queue])
+        except Exception as exc:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), value in zip(queue, values):
+            if not future.done():
+                future.set_result(value)
+
+def page_params(user_id: Optional[int] = None, offset: Optional[int] = None, limit: Optional[int] = None) -> Tuple:
+    params = []
+    if user_id is not None:
+        params.append(("user_id", user_id))
+    if offset:
+        params.append(("skip", offset))
+    if limit is not None:
+        params.append(("limit", limit))
+    return tuple(params)
+
+class Loaders:
+    """Per-request loaders; dedupe identical upstream fetches and batch per-user lookups."""
+
+    def __init__(self, client: httpx.AsyncClient, authorization: Optional[str] = None):
+        self.client = client
+        self.headers = {"Authorization": authorization} if authorization else {}
+        self.collection = DataLoader(self._fetch_collections)
+        self.attendances_by_user = DataLoader(lambda keys: self._fetch_by_user(ATTENDANCE_URL + "/attendances/", keys))
+        self.reservations_by_user = DataLoader(lambda keys: self._fetch_by_user(CATERING_URL + "/reservations/", keys))
+        self.access_logs_by_user = DataLoader(lambda keys: self._fetch_by_user(ACCESS_CONTROL_URL + "/access-logs/", keys))
+
+    async def _get(self, url: str, params) -> Any:
+        with external_call(urlsplit(url).hostname or "upstream"):
+            response = await self.client.get(url, params=list(params), headers=self.headers)
+            response.raise_for_status()
+        return response.json()
+
+    async def _fetch_collections(self, keys):
+        # keys are (url, params) pairs; distinct ones go out concurrently
+        return await asyncio.gather(*(self._get(url, params) for url, params in keys))
+
+    async def _fetch_by_user(self, url: str, user_ids):
+        rows = await self._get(url, [("user_id", user_id) for user_id in user_ids])
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[row["user_id"]].append(row)
+        return [grouped.get(user_id, []) for user_id in user_ids]
+
+    def fetch(self, url: str, user_id: Optional[int] = None, offset: Optional[int] = None, limit: Optional[int] = None):
+        return self.collection.load((url, page_params(user_id, offset, limit)))
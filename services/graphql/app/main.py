@@ -1,17 +1,46 @@
-from ariadne import QueryType, MutationType, gql, make_executable_schema
+from ariadne import QueryType, SubscriptionType, gql, make_executable_schema
 from ariadne.asgi import GraphQL
-from fastapi import FastAPI
-import requests
+from ariadne.asgi.handlers import GraphQLHTTPHandler, GraphQLTransportWSHandler
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import json
 import os
+import cache
+import clients
+import instrumentation
+import live
+from cache import CACHE_INVALIDATION_TOKEN, auth_scope, cached
+from clients import ATTENDANCE_URL, CATERING_URL, ACCESS_CONTROL_URL
+from limits import page, validation_rules
+from loaders import Loaders
+from persisted_queries import PersistedQueries, PersistedQueryError, cached_query_parser, load_allowlist
+
+opt_out_tracking = os.getenv("OPT_OUT_TRACKING", "false").lower() == "true"
+LIVE_FEED = os.getenv("LIVE_FEED", "true").lower() == "true"
 
 type_defs = gql("""
     type Query {
-        attendances: [Attendance!]!
-        reservations: [Reservation!]!
-        accessLogs: [AccessLog!]!
+        attendances(userId: Int, offset: Int, limit: Int = 100): [Attendance!]!
+        reservations(userId: Int, offset: Int, limit: Int = 100): [Reservation!]!
+        accessLogs(userId: Int, offset: Int, limit: Int = 100): [AccessLog!]!
         transparencyReport(userId: Int!): TransparencyReport!
     }
 
+    type Subscription {
+        liveEvents(topics: [String!], userId: Int): LiveEvent!
+    }
+
+    type LiveEvent {
+        topic: String!
+        op: String!
+        user_id: Int
+        data: String!
+    }
+
     type Attendance {
         id: Int!
         user_id: Int!
@@ -40,37 +69,147 @@ type_defs = gql("""
 """)
 
 query = QueryType()
-mutation = MutationType()
+subscription = SubscriptionType()
 
 @query.field("attendances")
-async def resolve_attendances(_, info):
-    response = requests.get(os.getenv("ATTENDANCE_URL") + "/attendances/")
-    return response.json()
+@cached("Attendance")
+async def resolve_attendances(_, info, userId=None, offset=None, limit=None):
+    offset, limit = page(offset, limit)
+    return await info.context["loaders"].fetch(ATTENDANCE_URL + "/attendances/", userId, offset, limit)
 
 @query.field("reservations")
-async def resolve_reservations(_, info):
-    response = requests.get(os.getenv("CATERING_URL") + "/reservations/")
-    return response.json()
+@cached("Reservation")
+async def resolve_reservations(_, info, userId=None, offset=None, limit=None):
+    offset, limit = page(offset, limit)
+    return await info.context["loaders"].fetch(CATERING_URL + "/reservations/", userId, offset, limit)
 
 @query.field("accessLogs")
-async def resolve_access_logs(_, info):
-    response = requests.get(os.getenv("ACCESS_CONTROL_URL") + "/access-logs/")
-    return response.json()
+@cached("AccessLog")
+async def resolve_access_logs(_, info, userId=None, offset=None, limit=None):
+    offset, limit = page(offset, limit)
+    return await info.context["loaders"].fetch(ACCESS_CONTROL_URL + "/access-logs/", userId, offset, limit)
 
 @query.field("transparencyReport")
+@cached("TransparencyReport", depends=("Attendance", "AccessLog"))
 async def resolve_transparency_report(_, info, userId: int):
     data_used = []
     if not opt_out_tracking:
-        response = requests.get(os.getenv("ATTENDANCE_URL") + f"/attendances/?user_id={userId}")
-        if response.json():
+        loaders = info.context["loaders"]
+        attendances, access_logs = await asyncio.gather(
+            loaders.attendances_by_user.load(userId),
+            loaders.access_logs_by_user.load(userId),
+        )
+        if attendances:
             data_used.append("Attendance data")
-        response = requests.get(os.getenv("ACCESS_CONTROL_URL") + f"/access-logs/?user_id={userId}")
-        if response.json():
+        if access_logs:
             data_used.append("Access logs")
     return {"user_id": userId, "data_used": data_used}
 
-schema = make_executable_schema(type_defs, query, mutation)
-graphql_app = GraphQL(schema, debug=True)
+@subscription.source("liveEvents")
+async def live_events_source(_, info, topics=None, userId=None):
+    user_ids = live.authorize(info.context.get("live_token"), [userId] if userId is not None else None)
+    subscriber = live.broker.subscribe(topics or live.LIVE_TOPICS, user_ids)
+    return live.events(live.broker, subscriber)
+
+@subscription.field("liveEvents")
+def resolve_live_event(event, info, topics=None, userId=None):
+    return {
+        "topic": event.topic,
+        "op": event.payload.get("op"),
+        "user_id": event.user_id,
+        "data": json.dumps(event.payload.get("data")),
+    }
+
+def get_context_value(request, _data=None):
+    authorization = request.headers.get("authorization")
+    return {
+        "request": request,
+        "loaders": Loaders(clients.get_client(), authorization),
+        "cache": cache.get_cache(),
+        "cache_scope": auth_scope(authorization),
+        "live_token": request.scope.get("live_token") or request.query_params.get("token"),
+    }
+
+def remember_live_token(websocket, payload):
+    # Browser websockets cannot send headers, so subscribers pass their live token in connection_init
+    if isinstance(payload, dict) and payload.get("token"):
+        websocket.scope["live_token"] = payload["token"]
+
+class GatewayHTTPHandler(GraphQLHTTPHandler):
+    async def execute_graphql_query(self, request, data, *, context_value=None, query_document=None):
+        if isinstance(data, dict):
+            try:
+                data = await persisted_queries().resolve(data)
+            except PersistedQueryError as error:
+                return False, {"errors": [error.formatted()]}
+        return await super().execute_graphql_query(request, data, context_value=context_value, query_document=query_document)
+
+_persisted_queries: Optional[PersistedQueries] = None
+
+def persisted_queries() -> PersistedQueries:
+    global _persisted_queries
+    if _persisted_queries is None:
+        _persisted_queries = PersistedQueries(cache.get_cache().backend, load_allowlist())
+    return _persisted_queries
+
+schema = make_executable_schema(type_defs, query, subscription)
+graphql_app = GraphQL(
+    schema,
+    context_value=get_context_value,
+    query_parser=cached_query_parser,
+    validation_rules=validation_rules,
+    http_handler=GatewayHTTPHandler(),
+    websocket_handler=GraphQLTransportWSHandler(on_connect=remember_live_token),
+    debug=True,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _persisted_queries
+    clients.http_client = clients.create_client()
+    cache.response_cache = cache.ResponseCache(cache.create_backend())
+    listener = asyncio.create_task(live.broker.listen()) if LIVE_FEED else None
+    loop_monitor = instrumentation.start_loop_monitor()
+    yield
+    loop_monitor.cancel()
+    if listener:
+        listener.cancel()
+    await clients.close_client()
+    await cache.close_cache()
+    _persisted_queries = None
+
+app = FastAPI(lifespan=lifespan)
+instrumentation.instrument(app)
+
+class CacheInvalidation(BaseModel):
+    types: List[str]
+    user_ids: Optional[List[int]] = None
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(invalidation: CacheInvalidation, x_invalidation_token: Optional[str] = Header(None)):
+    if CACHE_INVALIDATION_TOKEN and x_invalidation_token != CACHE_INVALIDATION_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid invalidation token")
+    await cache.get_cache().invalidate(invalidation.types, invalidation.user_ids)
+    return {"status": "invalidated"}
+
+@app.get("/live/events")
+async def live_events(token: Optional[str] = None, topics: Optional[str] = None, user_id: Optional[List[int]] = Query(None)):
+    try:
+        user_ids = live.authorize(token, user_id)
+    except live.InvalidLiveToken as error:
+        raise HTTPException(status_code=401, detail=str(error))
+    except live.ForbiddenUsers:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    try:
+        subscriber = live.broker.subscribe(topics.split(",") if topics else live.LIVE_TOPICS, user_ids)
+    except live.UnknownTopics as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except live.TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many live subscribers on this node")
+    return StreamingResponse(
+        live.stream(live.broker, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-app = FastAPI()
-app.mount("/", graphql_app)
\ No newline at end of file
+app.mount("/", graphql_app)
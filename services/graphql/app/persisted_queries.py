@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+from graphql import parse
+
+PERSISTED_QUERIES_FILE = os.getenv("PERSISTED_QUERIES_FILE")
+PERSISTED_QUERIES_ONLY = os.getenv("PERSISTED_QUERIES_ONLY", "false").lower() == "true"
+PERSISTED_QUERY_TTL = int(os.getenv("PERSISTED_QUERY_TTL", "86400"))
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+    def formatted(self) -> dict:
+        return {"message": str(self), "extensions": {"code": self.code}}
+
+def load_allowlist(path: Optional[str] = PERSISTED_QUERIES_FILE) -> Dict[str, str]:
+    """Reads a ``{sha256: query}`` JSON file of queries registered at deploy time."""
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+class PersistedQueries:
+    """Automatic persisted queries (Apollo protocol) with an optional deploy-time allowlist.
+
+    With ``only=True`` the gateway runs nothing but allowlisted queries.
+    """
+
+    def __init__(self, backend, allowlist: Optional[Dict[str, str]] = None, only: bool = PERSISTED_QUERIES_ONLY):
+        self.backend = backend
+        self.allowlist = allowlist or {}
+        self.only = only
+
+    async def resolve(self, data: dict) -> dict:
+        persisted = (data.get("extensions") or {}).get("persistedQuery")
+        query = data.get("query")
+        if not persisted:
+            if self.only:
+                raise PersistedQueryError("Only persisted queries are accepted", "PERSISTED_QUERY_REQUIRED")
+            return data
+        digest = persisted.get("sha256Hash")
+        if query:
+            if query_hash(query) != digest:
+                raise PersistedQueryError("provided sha does not match query", "BAD_REQUEST")
+            if self.only:
+                if digest not in self.allowlist:
+                    raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            else:
+                await self.backend.set("pq:" + digest, query, PERSISTED_QUERY_TTL)
+            return data
+        query = self.allowlist.get(digest)
+        if query is None and not self.only:
+            query = await self.backend.get("pq:" + digest)
+        if query is None:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        return {**data, "query": query}
+
+@lru_cache(maxsize=1024)
+def _parse(query: str):
+    return parse(query)
+
+def cached_query_parser(context_value, data):
+    # Dashboards resend the same handful of documents; parse each one once per worker
+    return _parse(data["query"])
@@ -0,0 +1,122 @@
+"""Load the GraphQL gateway against stub upstream services and report throughput and latency.
+
+    python benchmarks/bench_gateway.py --requests 2000 --concurrency 50 --upstream-latency 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import multiprocessing
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Query
+from typing import List, Optional
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def make_stub(latency: float, rows_per_user: int, users: int) -> FastAPI:
+    stub = FastAPI()
+    rows = [{"id": i, "user_id": i % users, "timestamp": "2025-04-20T08:00:00", "is_entry": True,
+             "menu_id": 1, "quantity": 1, "location": "Room 1"} for i in range(users * rows_per_user)]
+
+    def select(user_id, skip, limit):
+        selected = [r for r in rows if not user_id or r["user_id"] in user_id][skip:]
+        return selected if limit is None else selected[:limit]
+
+    @stub.get("/attendances/")
+    @stub.get("/reservations/")
+    @stub.get("/access-logs/")
+    async def collection(user_id: Optional[List[int]] = Query(None), skip: int = 0, limit: Optional[int] = None):
+        await asyncio.sleep(latency)
+        return select(user_id, skip, limit)
+
+    return stub
+
+def load_gateway():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+    from main import app
+    return app
+
+def run_server(factory, args, port: int, env: dict):
+    os.environ.update(env)
+    uvicorn.run(factory(*args), host="127.0.0.1", port=port, log_level="warning")
+
+def serve(factory, args, port: int, env: Optional[dict] = None) -> multiprocessing.Process:
+    # Each server gets its own process so the load driver does not share a GIL with it
+    process = multiprocessing.Process(target=run_server, args=(factory, args, port, env or {}), daemon=True)
+    process.start()
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+QUERIES = {
+    "transparency": "query($u: Int!) { a: transparencyReport(userId: $u) { data_used } b: transparencyReport(userId: 1) { data_used } }",
+    "dashboard": "query($u: Int!) { attendances(userId: $u, limit: 20) { id } reservations(userId: $u, limit: 20) { id } accessLogs(userId: $u, limit: 20) { id } }",
+}
+
+async def drive(url: str, query: str, total: int, concurrency: int, users: int):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                response = await client.post(url, json={"query": query, "variables": {"u": i % users}})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200 or "errors" in response.json():
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--upstream-latency", type=float, default=0.01)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rows-per-user", type=int, default=20)
+    parser.add_argument("--query", choices=sorted(QUERIES), default="transparency")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = serve(make_stub, (args.upstream_latency, args.rows_per_user, args.users), upstream_port)
+    url = f"http://127.0.0.1:{upstream_port}"
+    gateway_port = free_port()
+    gateway = serve(load_gateway, (), gateway_port, {name: url for name in ("ATTENDANCE_URL", "CATERING_URL", "ACCESS_CONTROL_URL")})
+    try:
+        result = asyncio.run(drive(f"http://127.0.0.1:{gateway_port}/", QUERIES[args.query], args.requests, args.concurrency, args.users))
+    finally:
+        gateway.terminate()
+        upstream.terminate()
+    result.update(query=args.query, concurrency=args.concurrency, upstream_latency_ms=args.upstream_latency * 1000)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
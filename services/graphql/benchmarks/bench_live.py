@@ -0,0 +1,61 @@
+"""Measure live-feed fan-out cost on one node.
+
+    python benchmarks/bench_live.py --subscribers 5000 --events 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from live import Broker, Event
+
+async def run(subscribers: int, events: int, slow_fraction: float, buffer_size: int):
+    broker = Broker(buffer_size=buffer_size, max_subscribers=subscribers)
+    tracemalloc.start()
+    clients = [broker.subscribe(["attendance"]) for _ in range(subscribers)]
+    slow = set(range(int(subscribers * slow_fraction)))
+    delivered = 0
+
+    async def drain():
+        nonlocal delivered
+        for i, client in enumerate(clients):
+            if i in slow:
+                continue
+            while not client.queue.empty():
+                client.queue.get_nowait()
+                delivered += 1
+
+    started = time.perf_counter()
+    for n in range(events):
+        broker.publish(Event("attendance", json.dumps({"op": "insert", "data": {"id": n, "user_id": n % 100}})))
+        if n % 10 == 9:
+            await drain()
+    await drain()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        "subscribers": subscribers,
+        "events": events,
+        "deliveries": delivered,
+        "deliveries_per_s": round(delivered / elapsed),
+        "elapsed_s": round(elapsed, 3),
+        "slow_dropped": broker.dropped,
+        "peak_mem_mb": round(peak / 2**20, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--buffer-size", type=int, default=64)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.subscribers, args.events, args.slow_fraction, args.buffer_size)), indent=2))
+
+if __name__ == "__main__":
+    main()
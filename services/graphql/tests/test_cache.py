@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import cache
+import clients
+import main
+from graphql import parse, validate
+from limits import depth_limit_validator
+from persisted_queries import query_hash
+
+def setup_gateway(calls):
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(200, json=[{"id": 1, "user_id": 1, "timestamp": "2025-04-20T08:00:00", "is_entry": True}])
+
+    clients.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    cache.response_cache = cache.ResponseCache(cache.MemoryBackend())
+    main._persisted_queries = None
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway")
+
+def test_cached_field_is_served_until_invalidated():
+    calls = []
+
+    async def run():
+        async with setup_gateway(calls) as gateway:
+            body = {"query": "{ attendances(userId: 1) { id } }"}
+            for _ in range(3):
+                assert (await gateway.post("/", json=body)).json()["data"]["attendances"] == [{"id": 1}]
+            assert len(calls) == 1
+            response = await gateway.post("/cache/invalidate", json={"types": ["Attendance"], "user_ids": [1]})
+            assert response.json() == {"status": "invalidated"}
+            await gateway.post("/", json=body)
+            assert len(calls) == 2
+
+    asyncio.run(run())
+
+def test_query_over_cost_limit_is_rejected():
+    calls = []
+
+    async def run():
+        async with setup_gateway(calls) as gateway:
+            response = await gateway.post("/", json={"query": "{ attendances(limit: 5000) { id } }"})
+            return response.json()
+
+    result = asyncio.run(run())
+    assert "maximum" in result["errors"][0]["message"]
+    assert calls == []
+
+def test_negative_paging_is_rejected():
+    calls = []
+
+    async def run():
+        async with setup_gateway(calls) as gateway:
+            literal = (await gateway.post("/", json={"query": "{ attendances(limit: -1) { id } }"})).json()
+            variables = (await gateway.post("/", json={"query": "query($n: Int) { accessLogs(offset: $n) { id } }", "variables": {"n": -5}})).json()
+            return literal, variables
+
+    literal, variables = asyncio.run(run())
+    assert "limit must be non-negative" in literal["errors"][0]["message"]
+    assert "offset must be non-negative" in variables["errors"][0]["message"]
+    assert calls == []
+
+def test_depth_limit():
+    document = parse("{ transparencyReport(userId: 1) { user_id } }")
+    assert validate(main.schema, document, [depth_limit_validator(2)]) == []
+    assert validate(main.schema, document, [depth_limit_validator(1)])
+
+def test_automatic_persisted_queries():
+    calls = []
+    query = "{ transparencyReport(userId: 1) { data_used } }"
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+    async def run():
+        async with setup_gateway(calls) as gateway:
+            missing = (await gateway.post("/", json={"extensions": extensions})).json()
+            registered = (await gateway.post("/", json={"query": query, "extensions": extensions})).json()
+            replayed = (await gateway.post("/", json={"extensions": extensions})).json()
+            return missing, registered, replayed
+
+    missing, registered, replayed = asyncio.run(run())
+    assert missing["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+    assert registered["data"] == replayed["data"]
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from jose import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import live
+from live import CLOSED, Broker, Event, ForbiddenUsers, InvalidLiveToken, UnknownTopics, authorize, stream
+
+SECRET = "test-live-secret"
+
+def live_token(user_id, role="employee", expires_in=60, secret=SECRET, algorithm="HS256", **claims):
+    claims = {"sub": str(user_id), "role": role, "aud": "live", "exp": int(time.time()) + expires_in, **claims}
+    return jwt.encode(claims, secret, algorithm=algorithm)
+
+def attendance_event(user_id):
+    return Event("attendance", json.dumps({"op": "insert", "data": {"id": user_id, "user_id": user_id}}))
+
+def test_events_fan_out_by_topic_and_user():
+    broker = Broker()
+    everyone = broker.subscribe(["attendance", "access"])
+    one_user = broker.subscribe(["attendance"], [2])
+    catering = broker.subscribe(["catering"])
+
+    broker.publish(attendance_event(1))
+    broker.publish(attendance_event(2))
+
+    assert everyone.queue.qsize() == 2
+    assert one_user.queue.get_nowait().user_id == 2
+    assert one_user.queue.empty()
+    assert catering.queue.empty()
+
+def test_slow_consumer_is_dropped_without_affecting_others():
+    broker = Broker(buffer_size=2)
+    slow = broker.subscribe(["attendance"])
+    fast = broker.subscribe(["attendance"])
+
+    for i in range(3):
+        broker.publish(attendance_event(i))
+        if i < 2:
+            fast.queue.get_nowait()
+
+    assert slow.dropped
+    assert slow.queue.get_nowait() is CLOSED
+    assert broker.count == 1 and broker.dropped == 1
+    assert fast.queue.get_nowait().user_id == 2
+
+def test_sse_stream_sends_frames_and_unsubscribes():
+    broker = Broker(buffer_size=1)
+    subscriber = broker.subscribe(["attendance"])
+    broker.publish(attendance_event(7))
+    broker.publish(attendance_event(8))
+
+    async def collect():
+        return [frame async for frame in stream(broker, subscriber, heartbeat=0.01)]
+
+    frames = asyncio.run(collect())
+    assert frames[-1].startswith(b"event: dropped")
+    assert broker.count == 0
+
+def test_unknown_topics_are_rejected_without_counting():
+    broker = Broker(max_subscribers=1)
+    for topics in ([], ["foo"], ["attendance", "foo"]):
+        with pytest.raises(UnknownTopics):
+            broker.subscribe(topics)
+    assert broker.count == 0
+    subscriber = broker.subscribe(["attendance"])
+    broker.unsubscribe(subscriber)
+    broker.unsubscribe(subscriber)
+    assert broker.count == 0
+
+def test_live_tokens_scope_subscribers(monkeypatch):
+    monkeypatch.setattr(live, "LIVE_TOKEN_SECRET", SECRET)
+    assert authorize(live_token(5)) == {5}
+    assert authorize(live_token(5), [5]) == {5}
+    assert authorize(live_token(1, role="hr")) is None
+    assert authorize(live_token(1, role="hr"), [5, 6]) == {5, 6}
+    with pytest.raises(ForbiddenUsers):
+        authorize(live_token(5), [6])
+    for token in (None, "garbage", live_token(5, expires_in=-1), live_token(5, secret="other"), live_token(5) + "x",
+                  live_token(5, algorithm="HS512"), live_token(5, aud="api"), live_token(5, nbf=int(time.time()) + 60)):
+        with pytest.raises(InvalidLiveToken):
+            authorize(token)
+
+def test_live_endpoints_require_a_token(monkeypatch):
+    import main
+
+    monkeypatch.setattr(live, "LIVE_TOKEN_SECRET", SECRET)
+    monkeypatch.setattr(live, "broker", Broker())
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway") as gateway:
+            assert (await gateway.get("/live/events")).status_code == 401
+            assert (await gateway.get("/live/events", params={"token": live_token(5), "user_id": 6})).status_code == 403
+            assert (await gateway.get("/live/events", params={"token": live_token(5), "topics": "foo"})).status_code == 400
+        assert live.broker.count == 0
+
+        class Info:
+            context = {"live_token": live_token(5)}
+
+        with pytest.raises(ForbiddenUsers):
+            await main.live_events_source(None, Info(), userId=6)
+        events = await main.live_events_source(None, Info(), topics=["attendance"])
+        live.broker.publish(attendance_event(6))
+        live.broker.publish(attendance_event(5))
+        assert (await events.__anext__()).user_id == 5
+        await events.aclose()
+        assert live.broker.count == 0
+
+    asyncio.run(run())
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import loaders as loaders_module
+from loaders import DataLoader, Loaders
+
+def make_loaders(calls):
+    def handler(request):
+        calls.append(request.url)
+        user_ids = [int(u) for u in request.url.params.get_list("user_id")]
+        return httpx.Response(200, json=[{"id": u, "user_id": u} for u in user_ids if u != 3])
+    return Loaders(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+def test_by_user_loads_are_batched_and_deduplicated():
+    calls = []
+
+    async def run():
+        loaders = make_loaders(calls)
+        return await asyncio.gather(
+            loaders.attendances_by_user.load(1),
+            loaders.attendances_by_user.load(2),
+            loaders.attendances_by_user.load(1),
+            loaders.attendances_by_user.load(3),
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(calls[0].params.get_list("user_id")) == ["1", "2", "3"]
+    assert results == [[{"id": 1, "user_id": 1}], [{"id": 2, "user_id": 2}], [{"id": 1, "user_id": 1}], []]
+
+def test_identical_collection_fetches_share_one_request():
+    calls = []
+
+    async def run():
+        loaders = make_loaders(calls)
+        url = "http://attendance/attendances/"
+        return await asyncio.gather(loaders.fetch(url, 1, limit=10), loaders.fetch(url, 1, limit=10), loaders.fetch(url, 2))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert calls[0].params.get("limit") == "10"
+
+def test_batch_errors_propagate_to_every_waiter():
+    async def failing(keys):
+        raise RuntimeError("upstream down")
+
+    async def run():
+        loader = DataLoader(failing)
+        return await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(run()))
+
+def test_batches_in_flight_are_referenced_until_done():
+    async def run():
+        release = asyncio.Event()
+
+        async def batch(keys):
+            await release.wait()
+            return keys
+
+        future = DataLoader(batch).load(1)
+        await asyncio.sleep(0)
+        in_flight = len(loaders_module.pending_batches)
+        release.set()
+        return in_flight, await future
+
+    assert asyncio.run(run()) == (1, 1)
+    assert not loaders_module.pending_batches